@@ -4,13 +4,22 @@ from datetime import datetime, timedelta
 import hashlib
 import sqlite3
 import os
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 import base64
 import json
+import re
 import time
+import sys
+import threading
+import logging
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import OrderedDict, deque, namedtuple
 from dateutil.relativedelta import relativedelta
 
+import pricing
+
 # Page config and custom CSS
 st.set_page_config(
     page_title="Luxury Car Rentals",
@@ -144,187 +153,1139 @@ if 'current_page' not in st.session_state:
 if 'selected_car' not in st.session_state:
     st.session_state.selected_car = None
 
-# Database setup - Modified for persistent storage
-def setup_database():
-    try:
-        db_exists = os.path.exists('car_rental.db')
-        conn = sqlite3.connect('car_rental.db')
-        c = conn.cursor()
+# Database connection management
+DB_PATH = 'car_rental.db'
+
+# Applied once to every new connection before it enters the pool
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA cache_size = -32000',
+    'PRAGMA temp_store = MEMORY',
+)
+
+class PooledConnection:
+    """Handle to a pooled connection; close() returns it to the pool"""
+
+    def __init__(self, pool, slot):
+        self._pool = pool
+        self._slot = slot
+        self._conn = slot.conn
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        # A nested handle entered inside the caller's open transaction must leave it to the caller
+        self._owns_transaction = self._slot.depth == 1 or not self._conn.in_transaction
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if not self._closed and self._owns_transaction:
+                if exc_type is None:
+                    self.commit()
+                else:
+                    self.rollback()
+        finally:
+            self.close()
+
+    def __del__(self):
+        # Safety net for code paths that never reach close(), e.g. st.rerun()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def cursor(self):
+        return TracedCursor(self._conn.cursor(), get_query_tracer())
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def after_commit(self, callback):
+        """Run callback once the current transaction commits; dropped on rollback"""
+        self._slot.on_commit.append(callback)
+
+    def commit(self):
+        self._conn.commit()
+        callbacks, self._slot.on_commit = self._slot.on_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._slot.on_commit = []
+        self._conn.rollback()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._pool.release(self._slot)
+
+class _ThreadSlot:
+    """Connection currently checked out by one thread"""
+
+    def __init__(self):
+        self.conn = None
+        self.depth = 0
+        self.on_commit = []  # callbacks waiting for the open transaction to commit
+
+class ConnectionPool:
+    """Process-wide pool of configured SQLite connections.
+
+    A thread keeps the same connection for nested acquires, so helpers such
+    as create_notification() called from inside a page handler share the
+    caller's connection instead of opening a second one. A `with` block
+    commits or rolls back only a transaction it owns: as the outermost
+    handle, or one that began inside the block. Entered while the caller's
+    transaction is open, it leaves the outcome to the caller. Work
+    registered with after_commit() runs when that shared transaction commits.
+    """
+
+    def __init__(self, db_path, max_idle=8, timeout=5.0):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        slot = getattr(self._local, 'slot', None)
+        if slot is None or slot.depth == 0:
+            slot = _ThreadSlot()
+            with self._lock:
+                if self._idle:
+                    slot.conn = self._idle.pop()
+            if slot.conn is None:
+                slot.conn = self._connect()
+            self._local.slot = slot
+        slot.depth += 1
+        return PooledConnection(self, slot)
+
+    def release(self, slot):
+        slot.depth -= 1
+        if slot.depth > 0:
+            return
+
+        conn, slot.conn = slot.conn, None
+        # Uncommitted work is discarded, exactly as closing the connection would
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+@st.cache_resource(show_spinner=False)
+def get_connection_pool(db_path):
+    """Get the connection pool shared by all sessions of this process"""
+    return ConnectionPool(db_path)
+
+def get_db_connection():
+    """Get a pooled database connection for the current thread"""
+    return get_connection_pool(DB_PATH).acquire()
+
+# Read cache shared by all sessions of this process
+# READ_CACHE_MAX_BYTES=0 turns the cache off, e.g. to measure uncached renders
+READ_CACHE_MAX_BYTES = int(os.environ.get('READ_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+READ_CACHE_TTL = 300  # seconds
+USER_CACHE_TTL = 30  # short, since other processes may write notifications
+
+def estimate_size(value):
+    """Rough deep size of a cached value in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return size
+
+class ReadCache:
+    """TTL + LRU cache for query results, bounded by an estimated byte size.
+
+    Keys are tuples such as ('catalog', ...) or ('user', email, 'context');
+    invalidate() drops every key that starts with the given prefix, and the
+    write paths call it after they commit. A load that overlaps an
+    invalidation of its key returns its value without caching it, since it
+    may have read the data from before the write.
+    """
+
+    def __init__(self, max_bytes=READ_CACHE_MAX_BYTES, ttl=READ_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Count of invalidate() calls, with the prefixes of the most recent ones
+        self._generation = 0
+        self._recent_invalidations = deque(maxlen=256)  # (generation, prefix)
+
+    def _invalidated_since(self, generation, key):
+        # Whether an invalidate() after generation covered key; assume so once the history is gone
+        if generation == self._generation:
+            return False
+        if not self._recent_invalidations or self._recent_invalidations[0][0] > generation + 1:
+            return True
+        return any(
+            later > generation and key[:len(prefix)] == prefix
+            for later, prefix in self._recent_invalidations
+        )
+
+    def get_or_load(self, key, loader, ttl=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            generation = self._generation
         
-        # Create users table with profile picture field
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                full_name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                phone TEXT NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT DEFAULT 'user',
-                profile_picture TEXT,
-                subscription_type TEXT DEFAULT 'free_renter',
-                subscription_expiry TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # Load outside the lock so a slow query does not block other sessions
+        value = loader()
+        ttl = self.ttl if ttl is None else ttl
+        size = estimate_size(value)
+        # ttl=0 asks for a fresh load that is not kept
+        if ttl <= 0 or size > self.max_bytes:
+            return value
+        
+        with self._lock:
+            if self._invalidated_since(generation, key):
+                return value
+            old = self._entries.pop(key, None)
+            if old:
+                self.size_bytes -= old[1]
+            self._entries[key] = (now + ttl, size, value)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+        return value
 
-        # Create car_listings table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS car_listings (
-                id INTEGER PRIMARY KEY,
-                owner_email TEXT NOT NULL,
-                model TEXT NOT NULL,
-                year INTEGER NOT NULL,
-                price REAL NOT NULL,
-                location TEXT NOT NULL,
-                description TEXT,
-                category TEXT NOT NULL,
-                specs TEXT NOT NULL,
-                listing_status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (owner_email) REFERENCES users (email)
-            )
-        ''')
+    def invalidate(self, prefix):
+        with self._lock:
+            self._generation += 1
+            self._recent_invalidations.append((self._generation, prefix))
+            stale = [key for key in self._entries if key[:len(prefix)] == prefix]
+            for key in stale:
+                self.size_bytes -= self._entries.pop(key)[1]
+            self.invalidations += len(stale)
 
-        # Create listing_images table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS listing_images (
-                id INTEGER PRIMARY KEY,
-                listing_id INTEGER NOT NULL,
-                image_data TEXT NOT NULL,
-                is_primary BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (listing_id) REFERENCES car_listings (id)
-            )
-        ''')
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
 
-        # Create bookings table with all required columns
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS bookings (
-                id INTEGER PRIMARY KEY,
-                user_email TEXT NOT NULL,
-                car_id INTEGER NOT NULL,
-                pickup_date TEXT NOT NULL,
-                return_date TEXT NOT NULL,
-                location TEXT NOT NULL,
-                total_price REAL NOT NULL,
-                insurance BOOLEAN,
-                driver BOOLEAN,
-                delivery BOOLEAN,
-                vip_service BOOLEAN,
-                booking_status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                insurance_price REAL DEFAULT 0,
-                driver_price REAL DEFAULT 0,
-                delivery_price REAL DEFAULT 0,
-                vip_service_price REAL DEFAULT 0,
-                FOREIGN KEY (user_email) REFERENCES users (email),
-                FOREIGN KEY (car_id) REFERENCES car_listings (id)
-            )
-        ''')
+@st.cache_resource(show_spinner=False)
+def get_read_cache():
+    """Get the read cache shared by all sessions of this process"""
+    return ReadCache()
 
-        # Create insurance_claims table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS insurance_claims (
-                id INTEGER PRIMARY KEY,
-                booking_id INTEGER NOT NULL,
-                user_email TEXT NOT NULL,
-                claim_date TEXT NOT NULL,
-                incident_date TEXT NOT NULL,
-                description TEXT NOT NULL,
-                damage_type TEXT NOT NULL,
-                claim_amount REAL NOT NULL,
-                evidence_images TEXT,
-                claim_status TEXT DEFAULT 'pending',
-                admin_notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (booking_id) REFERENCES bookings (id),
-                FOREIGN KEY (user_email) REFERENCES users (email)
-            )
-        ''')
+def invalidate_cache(*prefix):
+    """Drop cached reads whose key starts with prefix, e.g. ('user', email)"""
+    get_read_cache().invalidate(prefix)
 
-        # Create notifications table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY,
-                user_email TEXT NOT NULL,
-                message TEXT NOT NULL,
-                type TEXT NOT NULL,
-                read BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_email) REFERENCES users (email)
+# Query tracing - every statement run through the pool is timed and counted
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_LOG = os.path.join('logs', 'slow_queries.log')
+QUERY_TRACE_RERUNS = 50  # finished reruns kept for the admin Performance tab
+
+class QueryRecord:
+    """One executed statement; fetches add their time and rows to it"""
+
+    __slots__ = ('sql', 'params', 'handler', 'ms', 'rows', 'logged')
+
+    def __init__(self, sql, params, handler):
+        self.sql = sql
+        self.params = params
+        self.handler = handler
+        self.ms = 0.0
+        self.rows = 0
+        self.logged = False
+
+class RerunTrace:
+    """Queries run by one Streamlit rerun, attributed to the handler that ran them"""
+
+    def __init__(self, user_email):
+        self.user_email = user_email
+        self.page = None  # set when the page handler starts
+        self.handler = 'main'
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.ms = 0.0
+        self.queries = []
+
+class QueryTracer:
+    """Collects per-rerun query traces and writes slow queries to a rotating log.
+
+    begin_rerun()/end_rerun() bracket a rerun on the script thread; statements
+    run outside a rerun, e.g. migrations, are only checked against the slow
+    query threshold.
+    """
+
+    def __init__(self, log_path=SLOW_QUERY_LOG, slow_ms=SLOW_QUERY_MS, keep=QUERY_TRACE_RERUNS):
+        self.slow_ms = slow_ms
+        self.reruns = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        handler = RotatingFileHandler(log_path, maxBytes=5 * 1024 * 1024, backupCount=5, delay=True)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        self.slow_log = logging.getLogger('luxury_rentals.slow_queries')
+        self.slow_log.propagate = False
+        self.slow_log.handlers = [handler]
+        self.slow_log.setLevel(logging.INFO)
+
+    def begin_rerun(self, user_email):
+        self._local.trace = RerunTrace(user_email)
+
+    def set_handler(self, page):
+        """Attribute the following queries of this rerun to a page handler"""
+        trace = getattr(self._local, 'trace', None)
+        if trace:
+            trace.page = trace.handler = page
+
+    def end_rerun(self):
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return
+        self._local.trace = None
+        trace.ms = (time.perf_counter() - trace.start) * 1000
+        with self._lock:
+            self.reruns.append(trace)
+
+    def record(self, sql, params):
+        trace = getattr(self._local, 'trace', None)
+        query = QueryRecord(' '.join(sql.split()), params_shape(params), trace.handler if trace else None)
+        if trace:
+            trace.queries.append(query)
+        return query
+
+    def add_time(self, query, ms, rows=0):
+        query.ms += ms
+        query.rows += rows
+        if query.ms >= self.slow_ms and not query.logged:
+            query.logged = True
+            self.slow_log.info(
+                f"{query.ms:.1f} ms handler={query.handler or '-'} params={query.params} {query.sql}"
             )
-        ''')
 
-        # Create admin_reviews table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS admin_reviews (
-                id INTEGER PRIMARY KEY,
-                listing_id INTEGER NOT NULL,
-                admin_email TEXT NOT NULL,
-                comment TEXT,
-                review_status TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (listing_id) REFERENCES car_listings (id),
-                FOREIGN KEY (admin_email) REFERENCES users (email)
+    def recent_reruns(self):
+        with self._lock:
+            return list(self.reruns)
+
+def params_shape(params):
+    """Describe bound parameters by type only, e.g. '(str, int)', so no values are kept"""
+    if isinstance(params, dict):
+        return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+class TracedCursor:
+    """sqlite3.Cursor wrapper that reports every statement to the query tracer"""
+
+    def __init__(self, cursor, tracer):
+        self._cursor = cursor
+        self._tracer = tracer
+        self._query = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql, parameters=()):
+        self._query = self._tracer.record(sql, parameters)
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, parameters)
+        finally:
+            self._tracer.add_time(self._query, (time.perf_counter() - start) * 1000)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._query = self._tracer.record(sql, seq_of_parameters[0] if seq_of_parameters else ())
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_parameters)
+        finally:
+            self._tracer.add_time(self._query, (time.perf_counter() - start) * 1000, len(seq_of_parameters))
+        return self
+
+    def _fetch(self, fetch, *args):
+        # SQLite steps through the result while fetching, so this is query time too
+        start = time.perf_counter()
+        rows = fetch(*args)
+        if self._query:
+            self._tracer.add_time(self._query, (time.perf_counter() - start) * 1000, len(rows))
+        return rows
+
+    def fetchone(self):
+        rows = self._fetch(self._cursor.fetchmany, 1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=None):
+        return self._fetch(self._cursor.fetchmany, size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+@st.cache_resource(show_spinner=False)
+def get_query_tracer():
+    """Get the query tracer shared by all sessions of this process"""
+    return QueryTracer()
+
+# Database setup - versioned schema migrations
+def _create_base_schema(c):
+    # Create users table with profile picture field
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            phone TEXT NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            profile_picture TEXT,
+            subscription_type TEXT DEFAULT 'free_renter',
+            subscription_expiry TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create car_listings table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS car_listings (
+            id INTEGER PRIMARY KEY,
+            owner_email TEXT NOT NULL,
+            model TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            price REAL NOT NULL,
+            location TEXT NOT NULL,
+            description TEXT,
+            category TEXT NOT NULL,
+            specs TEXT NOT NULL,
+            listing_status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (owner_email) REFERENCES users (email)
+        )
+    ''')
+
+    # Create listing_images table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS listing_images (
+            id INTEGER PRIMARY KEY,
+            listing_id INTEGER NOT NULL,
+            image_data TEXT NOT NULL,
+            is_primary BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (listing_id) REFERENCES car_listings (id)
+        )
+    ''')
+
+    # Create bookings table with all required columns
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            car_id INTEGER NOT NULL,
+            pickup_date TEXT NOT NULL,
+            return_date TEXT NOT NULL,
+            location TEXT NOT NULL,
+            total_price REAL NOT NULL,
+            insurance BOOLEAN,
+            driver BOOLEAN,
+            delivery BOOLEAN,
+            vip_service BOOLEAN,
+            booking_status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            insurance_price REAL DEFAULT 0,
+            driver_price REAL DEFAULT 0,
+            delivery_price REAL DEFAULT 0,
+            vip_service_price REAL DEFAULT 0,
+            FOREIGN KEY (user_email) REFERENCES users (email),
+            FOREIGN KEY (car_id) REFERENCES car_listings (id)
+        )
+    ''')
+
+    # Create insurance_claims table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS insurance_claims (
+            id INTEGER PRIMARY KEY,
+            booking_id INTEGER NOT NULL,
+            user_email TEXT NOT NULL,
+            claim_date TEXT NOT NULL,
+            incident_date TEXT NOT NULL,
+            description TEXT NOT NULL,
+            damage_type TEXT NOT NULL,
+            claim_amount REAL NOT NULL,
+            evidence_images TEXT,
+            claim_status TEXT DEFAULT 'pending',
+            admin_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (booking_id) REFERENCES bookings (id),
+            FOREIGN KEY (user_email) REFERENCES users (email)
+        )
+    ''')
+
+    # Create notifications table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            message TEXT NOT NULL,
+            type TEXT NOT NULL,
+            read BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_email) REFERENCES users (email)
+        )
+    ''')
+
+    # Create admin_reviews table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS admin_reviews (
+            id INTEGER PRIMARY KEY,
+            listing_id INTEGER NOT NULL,
+            admin_email TEXT NOT NULL,
+            comment TEXT,
+            review_status TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (listing_id) REFERENCES car_listings (id),
+            FOREIGN KEY (admin_email) REFERENCES users (email)
+        )
+    ''')
+
+    # Create subscriptions table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS subscription_history (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            plan_type TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            amount_paid REAL NOT NULL,
+            payment_method TEXT,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_email) REFERENCES users (email)
+        )
+    ''')
+
+    # Create indexes
+    c.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_listings_status ON car_listings(listing_status)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_listings_category ON car_listings(category)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings(booking_status)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_email, read)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_claims_status ON insurance_claims(claim_status)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscription_history(user_email)')
+
+    # Create admin user if it does not exist yet
+    c.execute('''
+        INSERT OR IGNORE INTO users (full_name, email, phone, password, role)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        'Admin User',
+        'admin@luxuryrentals.com',
+        '+971500000000',
+        hash_password('admin123'),
+        'admin'
+    ))
+
+def _add_booking_service_prices(c):
+    # Check existing columns
+    c.execute("PRAGMA table_info(bookings)")
+    columns = [column[1] for column in c.fetchall()]
+    
+    # Add missing columns if they don't exist
+    if 'insurance_price' not in columns:
+        c.execute("ALTER TABLE bookings ADD COLUMN insurance_price REAL DEFAULT 0")
+    if 'driver_price' not in columns:
+        c.execute("ALTER TABLE bookings ADD COLUMN driver_price REAL DEFAULT 0")
+    if 'delivery_price' not in columns:
+        c.execute("ALTER TABLE bookings ADD COLUMN delivery_price REAL DEFAULT 0")
+    if 'vip_service_price' not in columns:
+        c.execute("ALTER TABLE bookings ADD COLUMN vip_service_price REAL DEFAULT 0")
+
+def _create_listing_search_index(c):
+    # External-content FTS5 index over the searchable listing columns
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS car_listings_fts USING fts5(
+            model, description, category, location,
+            content='car_listings', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+
+    # Keep the index in sync with car_listings
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS car_listings_fts_insert AFTER INSERT ON car_listings BEGIN
+            INSERT INTO car_listings_fts (rowid, model, description, category, location)
+            VALUES (new.id, new.model, new.description, new.category, new.location);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS car_listings_fts_delete AFTER DELETE ON car_listings BEGIN
+            INSERT INTO car_listings_fts (car_listings_fts, rowid, model, description, category, location)
+            VALUES ('delete', old.id, old.model, old.description, old.category, old.location);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS car_listings_fts_update
+        AFTER UPDATE OF model, description, category, location ON car_listings BEGIN
+            INSERT INTO car_listings_fts (car_listings_fts, rowid, model, description, category, location)
+            VALUES ('delete', old.id, old.model, old.description, old.category, old.location);
+            INSERT INTO car_listings_fts (rowid, model, description, category, location)
+            VALUES (new.id, new.model, new.description, new.category, new.location);
+        END
+    ''')
+
+    # Index existing listings and rank model matches above description matches
+    c.execute("INSERT INTO car_listings_fts (car_listings_fts) VALUES ('rebuild')")
+    c.execute("INSERT INTO car_listings_fts (car_listings_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 2.0, 2.0)')")
+
+def _move_images_to_store(c, batch_size=200):
+    # Move base64 image columns into the image store, one batch of rows at a time
+    def to_hash(image_ref):
+        if not image_ref or is_image_hash(image_ref):
+            return image_ref
+        try:
+            return store_image_bytes(base64.b64decode(image_ref))
+        except ValueError:
+            # Leave undecodable values in place rather than failing the upgrade
+            return image_ref
+
+    for table, column in (('listing_images', 'image_data'), ('users', 'profile_picture')):
+        last_id = 0
+        while True:
+            c.execute(f'''
+                SELECT id, {column} FROM {table}
+                WHERE id > ? AND length({column}) > 64
+                ORDER BY id LIMIT ?
+            ''', (last_id, batch_size))
+            rows = c.fetchall()
+            if not rows:
+                break
+            c.executemany(
+                f'UPDATE {table} SET {column} = ? WHERE id = ?',
+                [(to_hash(image_ref), row_id) for row_id, image_ref in rows]
             )
-        ''')
+            last_id = rows[-1][0]
 
-        # Create subscriptions table
+    # Evidence photos are a JSON array per claim
+    last_id = 0
+    while True:
         c.execute('''
-            CREATE TABLE IF NOT EXISTS subscription_history (
-                id INTEGER PRIMARY KEY,
-                user_email TEXT NOT NULL,
-                plan_type TEXT NOT NULL,
-                start_date TEXT NOT NULL,
-                end_date TEXT NOT NULL,
-                amount_paid REAL NOT NULL,
-                payment_method TEXT,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_email) REFERENCES users (email)
-            )
+            SELECT id, evidence_images FROM insurance_claims
+            WHERE id > ? AND evidence_images IS NOT NULL
+            ORDER BY id LIMIT ?
+        ''', (last_id, batch_size))
+        rows = c.fetchall()
+        if not rows:
+            break
+        updates = []
+        for row_id, evidence_images in rows:
+            try:
+                images = json.loads(evidence_images)
+            except json.JSONDecodeError:
+                continue
+            updates.append((json.dumps([to_hash(image_ref) for image_ref in images]), row_id))
+        c.executemany('UPDATE insurance_claims SET evidence_images = ? WHERE id = ?', updates)
+        last_id = rows[-1][0]
+
+def _create_listing_sort_indexes(c):
+    # Keyset pagination on the browse page walks these in order
+    c.execute('CREATE INDEX IF NOT EXISTS idx_listings_status_created ON car_listings(listing_status, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_listings_status_price ON car_listings(listing_status, price)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_listings_status_year ON car_listings(listing_status, year)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_listing_images_listing ON listing_images(listing_id, is_primary)')
+
+def _create_composite_indexes(c):
+    # Per-user lists filter on the owner column and order by created_at
+    c.execute('CREATE INDEX IF NOT EXISTS idx_bookings_user_created ON bookings(user_email, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_bookings_car_created ON bookings(car_id, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_listings_owner_created ON car_listings(owner_email, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_claims_user_created ON insurance_claims(user_email, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_claims_booking ON insurance_claims(booking_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_reviews_listing_created ON admin_reviews(listing_id, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(user_email, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_user_created ON subscription_history(user_email, created_at)')
+    
+    # Covered by the indexes above or by the UNIQUE constraint on users.email
+    c.execute('DROP INDEX IF EXISTS idx_users_email')
+    c.execute('DROP INDEX IF EXISTS idx_listings_status')
+    c.execute('DROP INDEX IF EXISTS idx_subscriptions_user')
+
+def _create_user_counters(c):
+    # Per-user counts kept current by triggers, so pages read one row instead of COUNT(*)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS user_counters (
+            user_email TEXT PRIMARY KEY,
+            unread_notifications INTEGER NOT NULL DEFAULT 0,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            listings INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+    # (table, owner column, counter column, columns an UPDATE must touch, whether a row counts)
+    counted = [
+        ('notifications', 'user_email', 'unread_notifications', 'user_email, read', '{row}.read = FALSE'),
+        ('bookings', 'user_email', 'bookings', 'user_email', '1'),
+        ('car_listings', 'owner_email', 'listings', 'owner_email', '1'),
+    ]
+    for table, owner, counter, columns, counts in counted:
+        counts_old, counts_new = counts.format(row='old'), counts.format(row='new')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_counter_insert AFTER INSERT ON {table}
+            WHEN {counts_new} BEGIN
+                INSERT INTO user_counters (user_email, {counter}) VALUES (new.{owner}, 1)
+                ON CONFLICT (user_email) DO UPDATE SET {counter} = {counter} + 1;
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_counter_delete AFTER DELETE ON {table}
+            WHEN {counts_old} BEGIN
+                UPDATE user_counters SET {counter} = {counter} - 1 WHERE user_email = old.{owner};
+            END
+        ''')
+        # Moving a row to another user, or changing whether it counts, moves it between counters
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_counter_update AFTER UPDATE OF {columns} ON {table}
+            WHEN old.{owner} IS NOT new.{owner} OR ({counts_old}) IS NOT ({counts_new}) BEGIN
+                UPDATE user_counters SET {counter} = {counter} - IFNULL({counts_old}, 0)
+                WHERE user_email = old.{owner};
+                INSERT INTO user_counters (user_email, {counter}) VALUES (new.{owner}, IFNULL({counts_new}, 0))
+                ON CONFLICT (user_email) DO UPDATE SET {counter} = {counter} + excluded.{counter};
+            END
         ''')
 
-        # Create indexes
-        c.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_listings_status ON car_listings(listing_status)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_listings_category ON car_listings(category)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings(booking_status)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_email, read)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_claims_status ON insurance_claims(claim_status)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscription_history(user_email)')
-
-        # Create admin user only if database is new
-        if not db_exists:
-            admin_password = hash_password('admin123')
-            c.execute('''
-                INSERT INTO users (full_name, email, phone, password, role)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                'Admin User',
-                'admin@luxuryrentals.com',
-                '+971500000000',
-                admin_password,
-                'admin'
-            ))
+    repair_user_counters(c)
 
-        conn.commit()
-        print("Database initialized successfully")
+def _create_notifications_archive(c):
+    # Read notifications past the retention period move here, keeping the hot table small
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS notifications_archive (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            message TEXT NOT NULL,
+            type TEXT NOT NULL,
+            read BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_notifications_archive_user_created ON notifications_archive(user_email, created_at)')
+    
+    # Lets the archiver find old read rows without scanning unread ones
+    c.execute('CREATE INDEX IF NOT EXISTS idx_notifications_read_created ON notifications(created_at) WHERE read = TRUE')
+
+def _create_broadcasts(c):
+    # One row per announcement to every user, instead of one notification per user
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY,
+            message TEXT NOT NULL,
+            type TEXT NOT NULL DEFAULT 'broadcast',
+            created_by TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (created_by) REFERENCES users(email)
+        )
+    ''')
+    
+    # Per-user cursors: broadcasts up to last_seen_id are read, up to cleared_id are hidden
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_cursors (
+            user_email TEXT PRIMARY KEY,
+            last_seen_id INTEGER NOT NULL DEFAULT 0,
+            cleared_id INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+def _create_booking_intervals(c):
+    # R*Tree over (car_id, day number) boxes of pending and confirmed bookings,
+    # so an availability check is a log-time window query instead of a scan
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS booking_intervals USING rtree_i32(
+            id, car_min, car_max, first_day, last_day
+        )
+    ''')
+    _create_booking_interval_triggers(c, DAY_NUMBER_SQL)
+    
+    active = ', '.join(f"'{status}'" for status in ACTIVE_BOOKING_STATUSES)
+    c.execute(f'''
+        INSERT INTO booking_intervals
+        SELECT id, car_id, car_id,
+            min({DAY_NUMBER_SQL.format('pickup_date')}, {DAY_NUMBER_SQL.format('return_date')}),
+            max({DAY_NUMBER_SQL.format('pickup_date')}, {DAY_NUMBER_SQL.format('return_date')})
+        FROM bookings WHERE booking_status IN ({active})
+    ''')
+
+def _create_booking_interval_triggers(c, day_sql):
+    # day_sql turns a bookings date column into a day number, e.g. DAY_NUMBER_SQL
+    active = ', '.join(f"'{status}'" for status in ACTIVE_BOOKING_STATUSES)
+    interval = f'''
+        SELECT new.id, new.car_id, new.car_id,
+            min({day_sql.format('new.pickup_date')}, {day_sql.format('new.return_date')}),
+            max({day_sql.format('new.pickup_date')}, {day_sql.format('new.return_date')})
+        WHERE new.booking_status IN ({active})
+    '''
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS bookings_interval_insert AFTER INSERT ON bookings BEGIN
+            INSERT INTO booking_intervals {interval};
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookings_interval_delete AFTER DELETE ON bookings BEGIN
+            DELETE FROM booking_intervals WHERE id = old.id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS bookings_interval_update
+        AFTER UPDATE OF car_id, pickup_date, return_date, booking_status ON bookings BEGIN
+            DELETE FROM booking_intervals WHERE id = old.id;
+            INSERT INTO booking_intervals {interval};
+        END
+    ''')
+
+# Date columns stored as day numbers (days since 1970-01-01) and timestamps as
+# epoch seconds, with the DDL of each rebuilt table; columns keep their order
+INTEGER_DATE_TABLES = {
+    'users': ({'subscription_expiry': 'day'}, '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            phone TEXT NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            profile_picture TEXT,
+            subscription_type TEXT DEFAULT 'free_renter',
+            subscription_expiry INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''),
+    'bookings': ({'pickup_date': 'day', 'return_date': 'day', 'created_at': 'epoch'}, '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            car_id INTEGER NOT NULL,
+            pickup_date INTEGER NOT NULL,
+            return_date INTEGER NOT NULL,
+            location TEXT NOT NULL,
+            total_price REAL NOT NULL,
+            insurance BOOLEAN,
+            driver BOOLEAN,
+            delivery BOOLEAN,
+            vip_service BOOLEAN,
+            booking_status TEXT DEFAULT 'pending',
+            created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            insurance_price REAL DEFAULT 0,
+            driver_price REAL DEFAULT 0,
+            delivery_price REAL DEFAULT 0,
+            vip_service_price REAL DEFAULT 0,
+            FOREIGN KEY (user_email) REFERENCES users (email),
+            FOREIGN KEY (car_id) REFERENCES car_listings (id)
+        )
+    '''),
+    'insurance_claims': ({'incident_date': 'day'}, '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY,
+            booking_id INTEGER NOT NULL,
+            user_email TEXT NOT NULL,
+            claim_date TEXT NOT NULL,
+            incident_date INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            damage_type TEXT NOT NULL,
+            claim_amount REAL NOT NULL,
+            evidence_images TEXT,
+            claim_status TEXT DEFAULT 'pending',
+            admin_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (booking_id) REFERENCES bookings (id),
+            FOREIGN KEY (user_email) REFERENCES users (email)
+        )
+    '''),
+    'subscription_history': ({'start_date': 'day', 'end_date': 'day'}, '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            plan_type TEXT NOT NULL,
+            start_date INTEGER NOT NULL,
+            end_date INTEGER NOT NULL,
+            amount_paid REAL NOT NULL,
+            payment_method TEXT,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_email) REFERENCES users (email)
+        )
+    '''),
+}
+
+def _encode_dates_as_integers(c, batch_size=5000):
+    # SQLite cannot change a column's type, so each table is rebuilt with the
+    # same columns and its rows copied across one id range at a time
+    encodings = {
+        'day': DAY_NUMBER_SQL,
+        'epoch': "CAST(strftime('%s', {}) AS INTEGER)",
+    }
+    for table, (columns, create_sql) in INTEGER_DATE_TABLES.items():
+        c.execute(f'PRAGMA table_info({table})')
+        names = [row[1] for row in c.fetchall()]
+        # Leave values that do not parse as they are rather than failing the upgrade
+        select = ', '.join(
+            f"COALESCE({encodings[columns[name]].format(name)}, {name})" if name in columns else name
+            for name in names
+        )
+        
+        # Indexes and triggers go with the old table; keep their definitions
+        c.execute(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+            (table,)
+        )
+        dependents = [row[0] for row in c.fetchall()]
         
+        c.execute(create_sql.format(table=f'{table}_new'))
+        c.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        max_id = c.fetchone()[0]
+        for start in range(0, max_id, batch_size):
+            c.execute(f'''
+                INSERT INTO {table}_new ({', '.join(names)})
+                SELECT {select} FROM {table} WHERE id > ? AND id <= ?
+            ''', (start, start + batch_size))
+        for name in columns:
+            c.execute(f'''
+                SELECT COUNT(*) FROM {table}_new WHERE {name} IS NOT NULL AND typeof({name}) != 'integer'
+            ''')
+            unparsed = c.fetchone()[0]
+            if unparsed:
+                print(f"Kept {unparsed} unparseable {table}.{name} values as text")
+        c.execute(f'DROP TABLE {table}')
+        c.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+        for sql in dependents:
+            c.execute(sql)
+    
+    # The availability triggers converted text dates; the columns are day numbers now
+    for trigger in ('insert', 'delete', 'update'):
+        c.execute(f'DROP TRIGGER bookings_interval_{trigger}')
+    _create_booking_interval_triggers(c, '{}')
+
+def _create_pricing_rules(c):
+    # Host adjustments to the daily rate, applied by pricing.quote_many()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS host_pricing_rules (
+            id INTEGER PRIMARY KEY,
+            listing_id INTEGER NOT NULL,
+            rule_type TEXT NOT NULL CHECK (rule_type IN ('weekend', 'season')),
+            start_day INTEGER,
+            end_day INTEGER,
+            adjustment_pct REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (listing_id) REFERENCES car_listings (id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_pricing_rules_listing ON host_pricing_rules(listing_id)')
+    
+    # Keep the quoted breakdown with the booking instead of re-deriving it later
+    c.execute("PRAGMA table_info(bookings)")
+    columns = [column[1] for column in c.fetchall()]
+    if 'base_price' not in columns:
+        c.execute("ALTER TABLE bookings ADD COLUMN base_price REAL")
+    if 'discount_amount' not in columns:
+        c.execute("ALTER TABLE bookings ADD COLUMN discount_amount REAL DEFAULT 0")
+    # Older bookings did not record a discount; this is the split the pages used to show
+    c.execute('''
+        UPDATE bookings
+        SET base_price = total_price - (insurance_price + driver_price + delivery_price + vip_service_price)
+        WHERE base_price IS NULL
+    ''')
+
+def _create_demand_pricing(c):
+    # Demand signals per day, category and location, kept up to date by refresh_price_suggestions()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS demand_stats (
+            day INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            location TEXT NOT NULL,
+            occupancy REAL NOT NULL,
+            lead_time REAL,
+            weekday_factor REAL NOT NULL,
+            multiplier REAL NOT NULL,
+            PRIMARY KEY (day, category, location)
+        ) WITHOUT ROWID
+    ''')
+    # Approved cars per group when its demand was computed; a new count recomputes the group
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS demand_fleet (
+            category TEXT NOT NULL,
+            location TEXT NOT NULL,
+            cars INTEGER NOT NULL,
+            PRIMARY KEY (category, location)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS price_suggestions (
+            listing_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            suggested_price REAL NOT NULL,
+            multiplier REAL NOT NULL,
+            PRIMARY KEY (listing_id, day)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Day ranges of bookings written since the last refresh, so only those days are recomputed
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS demand_dirty_ranges (
+            id INTEGER PRIMARY KEY,
+            first_day INTEGER NOT NULL,
+            last_day INTEGER NOT NULL
+        )
+    ''')
+    statuses = ', '.join(f"'{status}'" for status in DEMAND_BOOKING_STATUSES)
+    touched = '''
+        SELECT min({row}.pickup_date, {row}.return_date), max({row}.pickup_date, {row}.return_date)
+        WHERE {row}.booking_status IN ({statuses})
+    '''
+    old, new = (touched.format(row=row, statuses=statuses) for row in ('old', 'new'))
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS bookings_demand_insert AFTER INSERT ON bookings BEGIN
+            INSERT INTO demand_dirty_ranges (first_day, last_day) {new};
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS bookings_demand_delete AFTER DELETE ON bookings BEGIN
+            INSERT INTO demand_dirty_ranges (first_day, last_day) {old};
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS bookings_demand_update
+        AFTER UPDATE OF car_id, pickup_date, return_date, booking_status, created_at ON bookings BEGIN
+            INSERT INTO demand_dirty_ranges (first_day, last_day) {old} UNION ALL {new};
+        END
+    ''')
+    
+    # Loading the bookings around a day range starts from the ones still out on its first day
+    c.execute('CREATE INDEX IF NOT EXISTS idx_bookings_return ON bookings(return_date)')
+
+# Ordered (version, description, step) list; append new steps, never edit applied ones
+SCHEMA_MIGRATIONS = [
+    (1, 'Base schema', _create_base_schema),
+    (2, 'Booking service price columns', _add_booking_service_prices),
+    (3, 'Listing full-text search index', _create_listing_search_index),
+    (4, 'Move images out of the database', _move_images_to_store),
+    (5, 'Listing sort indexes', _create_listing_sort_indexes),
+    (6, 'Composite indexes for per-user queries', _create_composite_indexes),
+    (7, 'Trigger-maintained user counters', _create_user_counters),
+    (8, 'Notifications archive', _create_notifications_archive),
+    (9, 'Broadcast notifications', _create_broadcasts),
+    (10, 'Booking availability index', _create_booking_intervals),
+    (11, 'Integer-encoded dates', _encode_dates_as_integers),
+    (12, 'Host pricing rules and booking price breakdown', _create_pricing_rules),
+    (13, 'Demand statistics and price suggestions', _create_demand_pricing),
+]
+
+# Migrations that free enough pages to be worth a VACUUM afterwards
+VACUUM_AFTER_MIGRATIONS = {4, 11}
+
+def get_schema_version(c):
+    """Get the highest applied schema migration version"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+    return c.fetchone()[0]
+
+def run_migrations(conn):
+    """Apply pending schema migrations in order, one transaction per step"""
+    c = conn.cursor()
+    applied = []
+    for version, description, migrate in SCHEMA_MIGRATIONS:
+        # BEGIN IMMEDIATE serialises concurrent bootstraps; re-check inside the lock
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(c) >= version:
+                conn.rollback()
+                continue
+            migrate(c)
+            c.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Applied schema migration {version}: {description}")
+    
+    if VACUUM_AFTER_MIGRATIONS.intersection(applied):
+        c.execute('VACUUM')
+    return applied
+
+def setup_database():
+    """Create the database or bring an existing one up to the current schema"""
+    try:
+        conn = get_db_connection()
+        applied = run_migrations(conn)
+        if applied:
+            print("Database initialized successfully")
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         raise
     finally:
-        if conn:
+        if 'conn' in locals():
             conn.close()
 
+@st.cache_resource(show_spinner=False)
+def bootstrap_application(db_path):
+    """Prepare folders and the database once per process, not once per rerun"""
+    create_folder_structure()
+    setup_database()
+    if not SERVE_IMAGES_INLINE:
+        start_image_server(IMAGE_SERVER_PORT)
+    if NOTIFICATION_RETENTION_DAYS > 0:
+        start_notification_archiver(NOTIFICATION_RETENTION_DAYS, NOTIFICATION_ARCHIVE_INTERVAL)
+    return True
+
 # Authentication functions
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def create_user(full_name, email, phone, password, profile_picture=None, role='user'):
     try:
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
         
         c.execute('SELECT * FROM users WHERE email = ?', (email,))
@@ -335,14 +1296,24 @@ def create_user(full_name, email, phone, password, profile_picture=None, role='u
             'INSERT INTO users (full_name, email, phone, password, profile_picture, role) VALUES (?, ?, ?, ?, ?, ?)',
             (full_name, email, phone, hash_password(password), profile_picture, role)
         )
-        conn.commit()
         
+        # The welcome message commits together with the account
         create_notification(
             email,
             "Welcome to Luxury Car Rentals! Start exploring our premium collection.",
-            "welcome"
+            "welcome",
+            conn
         )
         
+        # Earlier announcements are not news to a new account
+        c.execute('''
+            INSERT OR REPLACE INTO broadcast_cursors (user_email, last_seen_id, cleared_id)
+            SELECT ?, COALESCE(MAX(id), 0), COALESCE(MAX(id), 0) FROM broadcasts
+        ''', (email,))
+        
+        conn.commit()
+        invalidate_cache('user', email)
+        
         return True
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -355,7 +1326,7 @@ def verify_user(email, password):
         if email == "admin@luxuryrentals.com" and password == "admin123":
             return True
             
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
         c.execute('SELECT password FROM users WHERE email = ?', (email,))
         result = c.fetchone()
@@ -372,7 +1343,7 @@ def verify_user(email, password):
 
 def get_user_role(email):
     try:
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
         c.execute('SELECT role FROM users WHERE email = ?', (email,))
         result = c.fetchone()
@@ -385,23 +1356,70 @@ def get_user_role(email):
             conn.close()
 
 def get_user_info(email):
+    def load():
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            c.execute('SELECT * FROM users WHERE email = ?', (email,))
+            return c.fetchone()
+        finally:
+            conn.close()
+    
     try:
-        conn = sqlite3.connect('car_rental.db')
-        c = conn.cursor()
-        c.execute('SELECT * FROM users WHERE email = ?', (email,))
-        result = c.fetchone()
-        conn.close()
-        return result
+        return get_read_cache().get_or_load(('user', email, 'info'), load, ttl=USER_CACHE_TTL)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return None
+
+# Everything the sidebar and page handlers need about the logged-in user
+UserContext = namedtuple('UserContext', [
+    'email', 'info', 'role', 'subscription_type', 'unread_count', 'booking_count', 'listing_count'
+])
+
+def load_user_context(email):
+    """Get the user context, from the read cache or with a single query"""
+    return get_read_cache().get_or_load(
+        ('user', email, 'context'),
+        lambda: _query_user_context(email),
+        ttl=USER_CACHE_TTL
+    )
+
+def _query_user_context(email):
+    # User row, role, subscription and counters in one query
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f'''
+            SELECT u.*,
+                COALESCE(uc.unread_notifications, 0) + ({UNREAD_BROADCASTS_SQL}),
+                COALESCE(uc.bookings, 0),
+                COALESCE(uc.listings, 0)
+            FROM users u
+            LEFT JOIN user_counters uc ON uc.user_email = u.email
+            LEFT JOIN broadcast_cursors bc ON bc.user_email = u.email
+            WHERE u.email = ?
+        ''', (email,))
+        row = c.fetchone()
     finally:
-        if 'conn' in locals():
-            conn.close()
+        conn.close()
+    
+    if not row:
+        return None
+    info = row[:-3]
+    return UserContext(email, info, info[5] or 'user', info[7] or 'free_renter', *row[-3:])
+
+def get_current_user():
+    """Get the context loaded for the logged-in user on this rerun"""
+    return st.session_state.get('user_context')
+
+def get_current_user_info():
+    """Get the users row of the logged-in user without another query"""
+    user = get_current_user()
+    return user.info if user else None
 
 def update_user_subscription(email, plan_type, months=1):
     try:
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
         
         start_date = datetime.now().date()
@@ -411,7 +1429,7 @@ def update_user_subscription(email, plan_type, months=1):
             UPDATE users 
             SET subscription_type = ?, subscription_expiry = ?
             WHERE email = ?
-        ''', (plan_type, end_date.isoformat(), email))
+        ''', (plan_type, day_number(end_date), email))
         
         amount = 0
         if plan_type == 'premium_renter':
@@ -430,20 +1448,22 @@ def update_user_subscription(email, plan_type, months=1):
         ''', (
             email, 
             plan_type, 
-            start_date.isoformat(), 
-            end_date.isoformat(), 
+            day_number(start_date), 
+            day_number(end_date), 
             amount,
             'Credit Card',
             'active'
         ))
         
-        conn.commit()
-        
         create_notification(
             email,
             f"Your subscription to {plan_type.replace('_', ' ').title()} has been activated until {end_date.strftime('%d %b %Y')}",
-            "subscription_activated"
+            "subscription_activated",
+            conn
         )
+        
+        conn.commit()
+        invalidate_cache('user', email)
 
         return True
     except sqlite3.Error as e:
@@ -500,7 +1520,7 @@ def get_subscription_benefits(plan_type):
         'premium_host': {
             'visibility': 'Boosted',
             'commission': '10% per booking',
-            'pricing_tools': 'Dynamic optimization',
+            'pricing_tools': 'Demand-based price suggestions, 7 days ahead',
             'damage_protection': 'Extra protection',
             'fraud_prevention': 'Enhanced verification',
             'payout_speed': 'Fast (1-2 days)',
@@ -510,7 +1530,7 @@ def get_subscription_benefits(plan_type):
         'elite_host': {
             'visibility': 'Top placement',
             'commission': '5% or zero up to limit',
-            'pricing_tools': 'AI-driven optimization',
+            'pricing_tools': 'Demand-based price suggestions, 14 days ahead, with demand breakdown',
             'damage_protection': 'Full protection',
             'fraud_prevention': 'AI risk assessment',
             'payout_speed': 'Same-day',
@@ -522,30 +1542,86 @@ def get_subscription_benefits(plan_type):
     return benefits.get(plan_type, benefits['free_renter'])
 
 # Notification functions
-def create_notification(user_email, message, type):
+NOTIFICATION_PAGE_SIZE = 20
+# Read notifications older than this move to notifications_archive; 0 keeps them forever
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', '90'))
+NOTIFICATION_ARCHIVE_INTERVAL = 3600  # seconds between archiver runs
+
+# Broadcasts past the user's cursor; a rowid range, so it costs only the unread ones
+UNREAD_BROADCASTS_SQL = 'SELECT COUNT(*) FROM broadcasts WHERE id > COALESCE(bc.last_seen_id, 0)'
+
+def create_notification(user_email, message, type, conn=None):
+    """Notify one user; see create_notifications()"""
+    create_notifications([(user_email, message, type)], conn)
+
+def create_notifications(notifications, conn=None):
+    """Insert (user_email, message, type) notifications with a single executemany.
+
+    Given the caller's connection, the rows join its open transaction and
+    commit (or roll back) with the action that caused them, and errors are
+    raised to the caller. Without one, they are committed on their own.
+    """
+    notifications = list(notifications)
+    if not notifications:
+        return
+    
+    if conn is None:
+        try:
+            with get_db_connection() as conn:
+                create_notifications(notifications, conn)
+        except sqlite3.Error as e:
+            print(f"Error creating notification: {e}")
+        return
+    
+    conn.cursor().executemany(
+        'INSERT INTO notifications (user_email, message, type) VALUES (?, ?, ?)',
+        notifications
+    )
+    
+    # Recipients' cached unread counts are stale once the caller commits
+    def invalidate_recipients():
+        for email in {notification[0] for notification in notifications}:
+            invalidate_cache('user', email)
+    conn.after_commit(invalidate_recipients)
+
+def create_broadcast(message, created_by, type='broadcast'):
+    """Announce a message to every user with a single row; returns its id or None"""
     try:
-        conn = sqlite3.connect('car_rental.db')
-        c = conn.cursor()
-        c.execute(
-            'INSERT INTO notifications (user_email, message, type) VALUES (?, ?, ?)',
-            (user_email, message, type)
-        )
-        conn.commit()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                'INSERT INTO broadcasts (message, type, created_by) VALUES (?, ?, ?)',
+                (message, type, created_by)
+            )
+            # Every cached unread count is stale; other processes catch up within USER_CACHE_TTL
+            conn.after_commit(lambda: invalidate_cache('user'))
+            return c.lastrowid
     except sqlite3.Error as e:
-        print(f"Error creating notification: {e}")
-    finally:
-        if 'conn' in locals():
-            conn.close()
+        print(f"Error creating broadcast: {e}")
+        return None
+
+def advance_broadcast_cursor(c, user_email, column='last_seen_id'):
+    """Move a user's broadcast cursor to the newest broadcast; one row whatever the backlog"""
+    c.execute(f'''
+        INSERT INTO broadcast_cursors (user_email, {column})
+        SELECT ?, COALESCE(MAX(id), 0) FROM broadcasts WHERE TRUE
+        ON CONFLICT (user_email) DO UPDATE SET {column} = excluded.{column}
+        WHERE excluded.{column} > {column}
+    ''', (user_email,))
 
 def get_unread_notifications_count(user_email):
     try:
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
-        c.execute(
-            'SELECT COUNT(*) FROM notifications WHERE user_email = ? AND read = FALSE',
-            (user_email,)
-        )
-        return c.fetchone()[0]
+        c.execute(f'''
+            SELECT COALESCE(uc.unread_notifications, 0) + ({UNREAD_BROADCASTS_SQL})
+            FROM users u
+            LEFT JOIN user_counters uc ON uc.user_email = u.email
+            LEFT JOIN broadcast_cursors bc ON bc.user_email = u.email
+            WHERE u.email = ?
+        ''', (user_email,))
+        row = c.fetchone()
+        return row[0] if row else 0
     except sqlite3.Error as e:
         print(f"Error counting notifications: {e}")
         return 0
@@ -555,24 +1631,127 @@ def get_unread_notifications_count(user_email):
 
 def mark_notifications_as_read(user_email):
     try:
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
+        # Only unread rows, so the counter triggers fire once per changed notification
         c.execute(
-            'UPDATE notifications SET read = TRUE WHERE user_email = ?',
+            'UPDATE notifications SET read = TRUE WHERE user_email = ? AND read = FALSE',
             (user_email,)
         )
+        advance_broadcast_cursor(c, user_email)
         conn.commit()
+        invalidate_cache('user', user_email)
     except sqlite3.Error as e:
         print(f"Error updating notifications: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
 
+def archive_read_notifications(conn, retention_days=NOTIFICATION_RETENTION_DAYS, batch_size=500):
+    """Move read notifications older than retention_days to the archive; returns rows moved.
+
+    Each batch is its own short write transaction so sessions are never
+    blocked for long, however much history has built up.
+    """
+    c = conn.cursor()
+    moved = 0
+    while True:
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            c.execute('''
+                SELECT id FROM notifications
+                WHERE read = TRUE AND created_at < datetime('now', ?)
+                ORDER BY created_at
+                LIMIT ?
+            ''', (f"-{retention_days} days", batch_size))
+            ids = [row[0] for row in c.fetchall()]
+            if not ids:
+                conn.rollback()
+                break
+            
+            placeholders = ','.join('?' * len(ids))
+            c.execute(f'''
+                INSERT OR IGNORE INTO notifications_archive (id, user_email, message, type, read, created_at)
+                SELECT id, user_email, message, type, read, created_at
+                FROM notifications WHERE id IN ({placeholders})
+            ''', ids)
+            c.execute(f'DELETE FROM notifications WHERE id IN ({placeholders})', ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved += len(ids)
+    return moved
+
+@st.cache_resource(show_spinner=False)
+def start_notification_archiver(retention_days, interval):
+    """Start the thread that applies the notification retention policy, once per process"""
+    pool = get_connection_pool(DB_PATH)
+    
+    def run():
+        while True:
+            try:
+                conn = pool.acquire()
+                try:
+                    moved = archive_read_notifications(conn, retention_days)
+                finally:
+                    conn.close()
+                if moved:
+                    print(f"Archived {moved} read notifications older than {retention_days} days")
+            except sqlite3.Error as e:
+                # Another process may hold the write lock; try again next time
+                print(f"Notification archiving error: {e}")
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=run, name='notification-archiver', daemon=True)
+    thread.start()
+    return thread
+
+def repair_user_counters(c):
+    """Recompute user_counters from the counted tables; returns the users corrected.
+
+    The triggers keep the counters exact, so this is only needed after writes
+    that bypassed them, e.g. a restore or a manual edit with triggers dropped.
+    """
+    c.execute('DROP TABLE IF EXISTS temp.expected_counters')
+    c.execute('''
+        CREATE TEMP TABLE expected_counters AS
+        SELECT user_email, SUM(unread) AS unread_notifications, SUM(bookings) AS bookings, SUM(listings) AS listings
+        FROM (
+            SELECT user_email, COUNT(*) AS unread, 0 AS bookings, 0 AS listings
+            FROM notifications WHERE read = FALSE GROUP BY user_email
+            UNION ALL
+            SELECT user_email, 0, COUNT(*), 0 FROM bookings GROUP BY user_email
+            UNION ALL
+            SELECT owner_email, 0, 0, COUNT(*) FROM car_listings GROUP BY owner_email
+        )
+        GROUP BY user_email
+    ''')
+    
+    # Users whose stored counters differ, including stored rows that should be all zero
+    c.execute('''
+        SELECT COUNT(DISTINCT user_email) FROM (
+            SELECT * FROM (SELECT * FROM expected_counters EXCEPT SELECT * FROM user_counters)
+            UNION ALL
+            SELECT * FROM (
+                SELECT * FROM user_counters
+                WHERE unread_notifications != 0 OR bookings != 0 OR listings != 0
+                EXCEPT SELECT * FROM expected_counters
+            )
+        )
+    ''')
+    corrected = c.fetchone()[0]
+    
+    c.execute('DELETE FROM user_counters')
+    c.execute('INSERT INTO user_counters SELECT * FROM expected_counters')
+    c.execute('DROP TABLE temp.expected_counters')
+    return corrected
+
 # Insurance claim functions
 def create_insurance_claim(booking_id, user_email, incident_date, description, damage_type, claim_amount, evidence_images=None):
     """Create a new insurance claim"""
     try:
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
         
         # Check if this booking exists and belongs to the user
@@ -596,7 +1775,7 @@ def create_insurance_claim(booking_id, user_email, incident_date, description, d
             booking_id,
             user_email,
             datetime.now().date().isoformat(),
-            incident_date,
+            day_number(incident_date),
             description,
             damage_type,
             claim_amount,
@@ -604,22 +1783,14 @@ def create_insurance_claim(booking_id, user_email, incident_date, description, d
             'pending'
         ))
         
-        conn.commit()
-        
-        # Create notification for user
-        create_notification(
-            user_email,
-            f"Your insurance claim for booking #{booking_id} has been submitted for review.",
-            "claim_submitted"
-        )
-        
-        # Create notification for admin
+        # Notify the user and the admin in the same transaction as the claim
         admin_email = "admin@luxuryrentals.com"
-        create_notification(
-            admin_email,
-            f"New insurance claim submitted by {user_email} for booking #{booking_id}.",
-            "admin_claim_submitted"
-        )
+        create_notifications([
+            (user_email, f"Your insurance claim for booking #{booking_id} has been submitted for review.", "claim_submitted"),
+            (admin_email, f"New insurance claim submitted by {user_email} for booking #{booking_id}.", "admin_claim_submitted"),
+        ], conn)
+        
+        conn.commit()
         
         return True, "Claim submitted successfully"
     except sqlite3.Error as e:
@@ -632,7 +1803,7 @@ def create_insurance_claim(booking_id, user_email, incident_date, description, d
 def update_claim_status(claim_id, new_status, admin_notes=None):
     """Update insurance claim status"""
     try:
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
         
         # Get claim details first
@@ -653,17 +1824,18 @@ def update_claim_status(claim_id, new_status, admin_notes=None):
                 'UPDATE insurance_claims SET claim_status = ? WHERE id = ?',
                 (new_status, claim_id)
             )
-            
-        conn.commit()
         
         # Create notification for user
         user_email, booking_id = claim
         create_notification(
             user_email,
             f"Your insurance claim for booking #{booking_id} has been {new_status}. {admin_notes if admin_notes else ''}",
-            f"claim_{new_status}"
+            f"claim_{new_status}",
+            conn
         )
         
+        conn.commit()
+        
         return True, f"Claim successfully {new_status}"
     except sqlite3.Error as e:
         print(f"Error updating claim: {e}")
@@ -673,6 +1845,380 @@ def update_claim_status(claim_id, new_status, admin_notes=None):
             conn.close()
 
 
+# Batch loaders - fetch related rows for a whole page of parents in one query
+def batch_load(c, query, keys, key_index=0, chunk_size=500):
+    """Run query for all keys at once and group the rows by key.
+
+    query must contain an {placeholders} slot for the IN (...) list; keys are
+    sent in chunks to stay under SQLite's bound-parameter limit.
+    """
+    keys = list(dict.fromkeys(keys))
+    grouped = {key: [] for key in keys}
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        c.execute(query.format(placeholders=','.join('?' * len(chunk))), chunk)
+        for row in c.fetchall():
+            grouped.setdefault(row[key_index], []).append(row)
+    return grouped
+
+def load_listing_images(c, listing_ids):
+    """Get listing_images rows for many listings, keyed by listing id"""
+    return batch_load(c, '''
+        SELECT * FROM listing_images
+        WHERE listing_id IN ({placeholders})
+        ORDER BY listing_id, id
+    ''', listing_ids, key_index=1)
+
+def load_latest_reviews(c, listing_ids):
+    """Get the latest (comment, review_status, created_at) review per listing"""
+    grouped = batch_load(c, '''
+        SELECT listing_id, comment, review_status, created_at
+        FROM admin_reviews
+        WHERE listing_id IN ({placeholders})
+        ORDER BY listing_id, created_at DESC, id DESC
+    ''', listing_ids)
+    return {listing_id: rows[0][1:] for listing_id, rows in grouped.items() if rows}
+
+def load_claimed_booking_ids(c, booking_ids):
+    """Get the subset of booking ids that already have an insurance claim"""
+    grouped = batch_load(c, '''
+        SELECT booking_id FROM insurance_claims
+        WHERE booking_id IN ({placeholders})
+    ''', booking_ids)
+    return {booking_id for booking_id, rows in grouped.items() if rows}
+
+# Date encoding - calendar dates are stored as day numbers, booking timestamps as epoch seconds
+DAY_NUMBER_SQL = "CAST(julianday({}) - 2440587.5 AS INTEGER)"  # days since 1970-01-01
+EPOCH_DATE = datetime(1970, 1, 1).date()
+
+def day_number(value):
+    """Days since 1970-01-01 for a date, an ISO date string or a stored day number"""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return (value - EPOCH_DATE).days
+
+def day_to_date(day):
+    """The date a stored day number stands for"""
+    return EPOCH_DATE + timedelta(days=day)
+
+def format_day(day):
+    """A stored day number as an ISO date for display; empty for None.
+
+    Dates the integer migration could not parse were kept as their original
+    text and are shown as they are.
+    """
+    if day is None:
+        return ''
+    if not isinstance(day, int):
+        return str(day)
+    return day_to_date(day).isoformat()
+
+# Booking availability
+# Bookings that hold the car; both dates are inclusive rental days
+ACTIVE_BOOKING_STATUSES = ('pending', 'confirmed')
+
+def find_booking_conflicts(c, car_id, pickup_date, return_date, exclude_id=None, statuses=ACTIVE_BOOKING_STATUSES):
+    """Bookings of car_id in statuses that overlap the dates, as (id, pickup_date, return_date, booking_status).
+
+    Run it after BEGIN IMMEDIATE and write in the same transaction, so no
+    other session can book the car in between.
+    """
+    placeholders = ','.join('?' * len(statuses))
+    # CROSS JOIN keeps the R*Tree window query as the outer loop
+    c.execute(f'''
+        SELECT b.id, b.pickup_date, b.return_date, b.booking_status
+        FROM booking_intervals bi
+        CROSS JOIN bookings b ON b.id = bi.id
+        WHERE bi.car_min <= ? AND bi.car_max >= ?
+            AND bi.first_day <= ? AND bi.last_day >= ?
+            AND bi.id IS NOT ? AND b.booking_status IN ({placeholders})
+        ORDER BY b.pickup_date
+    ''', (car_id, car_id, day_number(return_date), day_number(pickup_date), exclude_id, *statuses))
+    return c.fetchall()
+
+def load_booking_conflicts(c, booking_ids):
+    """Other pending or confirmed bookings of the same car overlapping each booking, keyed by booking id"""
+    grouped = batch_load(c, '''
+        SELECT mine.id, b.id, b.pickup_date, b.return_date, b.booking_status
+        FROM booking_intervals mine
+        JOIN booking_intervals other
+            ON other.car_min <= mine.car_max AND other.car_max >= mine.car_min
+            AND other.first_day <= mine.last_day AND other.last_day >= mine.first_day
+        JOIN bookings b ON b.id = other.id
+        WHERE mine.id IN ({placeholders}) AND other.id != mine.id
+        ORDER BY mine.id, b.pickup_date
+    ''', booking_ids)
+    return {booking_id: [row[1:] for row in rows] for booking_id, rows in grouped.items()}
+
+def fetch_pricing_rules(c, listing_ids):
+    """Host pricing rules for many listings, as a pricing.RULE_COLUMNS DataFrame"""
+    grouped = batch_load(c, f'''
+        SELECT {', '.join(pricing.RULE_COLUMNS)} FROM host_pricing_rules
+        WHERE listing_id IN ({{placeholders}})
+        ORDER BY listing_id, id
+    ''', listing_ids, key_index=1)
+    return pd.DataFrame([row for rows in grouped.values() for row in rows], columns=pricing.RULE_COLUMNS)
+
+def load_pricing_rules(listing_ids):
+    """fetch_pricing_rules through the read cache; rule and listing writes invalidate ('catalog',)"""
+    listing_ids = tuple(listing_ids)
+    def load():
+        conn = get_db_connection()
+        try:
+            return fetch_pricing_rules(conn.cursor(), listing_ids)
+        finally:
+            conn.close()
+    return get_read_cache().get_or_load(('catalog', 'pricing', listing_ids), load)
+
+def add_pricing_rule(listing_id, owner_email, rule_type, adjustment_pct, start_day=None, end_day=None):
+    """Add a weekend or seasonal rate adjustment to one of the owner's listings; returns (success, message)"""
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            # Adjustments on the same day add up; refuse a rule that would take any day below the floor
+            rules = fetch_pricing_rules(c, [listing_id])
+            new_rule = pd.DataFrame(
+                [(None, listing_id, rule_type, start_day, end_day, adjustment_pct)], columns=pricing.RULE_COLUMNS
+            )
+            combined = pd.concat([rules, new_rule], ignore_index=True) if len(rules) else new_rule
+            if pricing.lowest_adjustment(combined) < pricing.MIN_ADJUSTMENT_PCT:
+                return False, (
+                    f"With your other rules this would lower the rate by more than "
+                    f"{-pricing.MIN_ADJUSTMENT_PCT}% on some days"
+                )
+            c.execute('''
+                INSERT INTO host_pricing_rules (listing_id, rule_type, start_day, end_day, adjustment_pct)
+                SELECT id, ?, ?, ?, ? FROM car_listings WHERE id = ? AND owner_email = ?
+            ''', (rule_type, start_day, end_day, adjustment_pct, listing_id, owner_email))
+            if c.rowcount != 1:
+                return False, "Listing not found"
+            conn.after_commit(lambda: invalidate_cache('catalog'))
+            return True, "Pricing rule added"
+    except sqlite3.Error as e:
+        print(f"Error adding pricing rule: {e}")
+        return False, f"Database error: {str(e)}"
+
+def delete_pricing_rule(rule_id, owner_email):
+    """Remove a pricing rule from one of the owner's listings"""
+    try:
+        with get_db_connection() as conn:
+            conn.cursor().execute('''
+                DELETE FROM host_pricing_rules
+                WHERE id = ? AND listing_id IN (SELECT id FROM car_listings WHERE owner_email = ?)
+            ''', (rule_id, owner_email))
+            conn.after_commit(lambda: invalidate_cache('catalog'))
+    except sqlite3.Error as e:
+        print(f"Error deleting pricing rule: {e}")
+
+# Demand-driven price suggestions
+# Bookings that count as demand: requests and rentals, not rejections or cancellations
+DEMAND_BOOKING_STATUSES = ('pending', 'confirmed', 'completed')
+
+def fetch_demand_bookings(c, first_day, last_day):
+    """Demand bookings overlapping the days, as the bookings frame pricing.demand_by_day() takes.
+
+    Dates the integer migration kept as text are skipped; a text created_at
+    gives a NULL booked_day, which leaves the booking out of the lead time.
+    """
+    # The status index would walk almost every booking; recent days are a short return-date range
+    placeholders = ','.join('?' * len(DEMAND_BOOKING_STATUSES))
+    c.execute(f'''
+        SELECT cl.category, cl.location, b.pickup_date, b.return_date,
+            CASE WHEN typeof(b.created_at) = 'integer' THEN b.created_at / 86400 END
+        FROM bookings b INDEXED BY idx_bookings_return
+        JOIN car_listings cl ON cl.id = b.car_id
+        WHERE b.return_date >= ? AND b.pickup_date <= ? AND b.booking_status IN ({placeholders})
+            AND typeof(b.pickup_date) = 'integer' AND typeof(b.return_date) = 'integer'
+    ''', (first_day, last_day, *DEMAND_BOOKING_STATUSES))
+    return pd.DataFrame(c.fetchall(), columns=['category', 'location', 'pickup_day', 'return_day', 'booked_day'])
+
+def _store_demand(c, fleet, first_day, last_day, bookings=None):
+    # Recompute the days for the fleet groups from the bookings their windows cover
+    if bookings is None:
+        bookings = fetch_demand_bookings(c, first_day - pricing.DEMAND_LOOKBACK + 1, last_day)
+    demand = pricing.demand_by_day(bookings, fleet, first_day, last_day)
+    c.executemany(f'''
+        INSERT OR REPLACE INTO demand_stats ({', '.join(pricing.DEMAND_COLUMNS)})
+        VALUES ({', '.join('?' * len(pricing.DEMAND_COLUMNS))})
+    ''', demand.astype(object).itertuples(index=False, name=None))
+    return last_day - first_day + 1
+
+def _merge_day_ranges(ranges):
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+def refresh_price_suggestions(c, today=None, full=False):
+    """Bring demand_stats up to date and rewrite price_suggestions; returns (days recomputed, suggestions).
+
+    Only days whose demand windows hold a booking written since the last
+    refresh are recomputed, plus the whole history of any category and
+    location whose number of approved cars changed; full=True recomputes
+    everything. Run it inside a write transaction.
+    """
+    today = day_number(today or datetime.now().date())
+    c.execute('''
+        SELECT category, location, COUNT(*) FROM car_listings
+        WHERE listing_status = 'approved'
+        GROUP BY category, location
+    ''')
+    fleet = pd.DataFrame(c.fetchall(), columns=['category', 'location', 'cars'])
+    c.execute('SELECT category, location, cars FROM demand_fleet')
+    computed = pd.DataFrame(c.fetchall(), columns=['category', 'location', 'cars'])
+    changed = fleet.merge(computed, how='left', indicator=True)['_merge'].eq('left_only').to_numpy() | full
+    
+    # Ranges of dates the integer migration kept as text cannot be placed; skip them
+    c.execute('''
+        SELECT first_day, last_day FROM demand_dirty_ranges
+        WHERE typeof(first_day) = 'integer' AND typeof(last_day) = 'integer'
+    ''')
+    # A booking day feeds the windows of the DEMAND_LOOKBACK days from it onwards
+    dirty = [(first, last + pricing.DEMAND_LOOKBACK - 1) for first, last in c.fetchall()]
+    c.execute('DELETE FROM demand_dirty_ranges')
+    
+    recomputed = 0
+    if changed.any():
+        c.execute('SELECT (SELECT MIN(return_date) FROM bookings), (SELECT MAX(return_date) FROM bookings)')
+        earliest, latest = c.fetchone()
+        bookings = fetch_demand_bookings(c, earliest, latest) if earliest is not None else None
+        if bookings is not None and len(bookings):
+            first_day = int(bookings['pickup_day'].min())
+            last_day = latest + pricing.DEMAND_LOOKBACK - 1
+            recomputed += _store_demand(c, fleet[changed], first_day, last_day, bookings)
+        c.execute('DELETE FROM demand_fleet')
+        c.executemany(
+            'INSERT INTO demand_fleet (category, location, cars) VALUES (?, ?, ?)',
+            fleet.astype(object).itertuples(index=False, name=None)
+        )
+    if (~changed).any():
+        for first_day, last_day in _merge_day_ranges(dirty):
+            recomputed += _store_demand(c, fleet[~changed], first_day, last_day)
+    
+    # Suggestions are cheap to derive, so every approved listing gets a fresh horizon
+    c.execute('''
+        SELECT id, category, location, price FROM car_listings WHERE listing_status = 'approved'
+    ''')
+    listings = pd.DataFrame(c.fetchall(), columns=['listing_id', 'category', 'location', 'daily_rate'])
+    c.execute(f'''
+        SELECT {', '.join(pricing.DEMAND_COLUMNS)} FROM demand_stats WHERE day BETWEEN ? AND ?
+    ''', (today, today + pricing.SUGGESTION_DAYS - 1))
+    demand = pd.DataFrame(c.fetchall(), columns=pricing.DEMAND_COLUMNS)
+    suggestions = pricing.suggest_prices(listings, demand, today)
+    c.execute('DELETE FROM price_suggestions')
+    c.executemany(
+        'INSERT INTO price_suggestions (listing_id, day, suggested_price, multiplier) VALUES (?, ?, ?, ?)',
+        suggestions.astype(object).itertuples(index=False, name=None)
+    )
+    return recomputed, len(suggestions)
+
+def load_price_suggestions(c, listing_ids):
+    """Suggested prices from today on with the demand behind them, keyed by listing id"""
+    today = day_number(datetime.now().date())
+    grouped = batch_load(c, '''
+        SELECT ps.listing_id, ps.day, ps.suggested_price, ps.multiplier,
+            ds.occupancy, ds.lead_time, ds.weekday_factor
+        FROM price_suggestions ps
+        JOIN car_listings cl ON cl.id = ps.listing_id
+        LEFT JOIN demand_stats ds ON ds.day = ps.day AND ds.category = cl.category AND ds.location = cl.location
+        WHERE ps.listing_id IN ({placeholders})
+        ORDER BY ps.listing_id, ps.day
+    ''', listing_ids)
+    return {listing_id: [row for row in rows if row[1] >= today] for listing_id, rows in grouped.items()}
+
+# Page queries - shared by the pages and by benchmark.py
+def fetch_user_bookings(c, user_email):
+    """Bookings made by a renter, newest first, with car details and primary image"""
+    c.execute('''
+        SELECT b.*, cl.model, cl.year, cl.owner_email, li.image_data
+        FROM bookings b
+        JOIN car_listings cl ON b.car_id = cl.id
+        LEFT JOIN listing_images li ON cl.id = li.listing_id AND li.is_primary = TRUE
+        WHERE b.user_email = ?
+        ORDER BY b.created_at DESC
+    ''', (user_email,))
+    return c.fetchall()
+
+def fetch_owner_bookings(c, owner_email):
+    """Bookings for an owner's cars, newest first, with renter and primary image"""
+    c.execute('''
+        SELECT b.*, cl.model, cl.year, b.user_email as renter_email, li.image_data
+        FROM bookings b
+        JOIN car_listings cl ON b.car_id = cl.id
+        LEFT JOIN listing_images li ON cl.id = li.listing_id AND li.is_primary = TRUE
+        WHERE cl.owner_email = ?
+        ORDER BY b.created_at DESC
+    ''', (owner_email,))
+    return c.fetchall()
+
+def fetch_all_claims(c):
+    """All insurance claims for admin review, pending first"""
+    c.execute('''
+        SELECT ic.*, u.full_name, b.car_id, cl.model, cl.year
+        FROM insurance_claims ic
+        JOIN users u ON ic.user_email = u.email
+        JOIN bookings b ON ic.booking_id = b.id
+        JOIN car_listings cl ON b.car_id = cl.id
+        ORDER BY ic.claim_status = 'pending' DESC, ic.created_at DESC
+    ''')
+    return c.fetchall()
+
+def _after_cursor(cursor, source):
+    # Rows of one source that sort after cursor in (created_at, source, id) DESC order
+    if not cursor:
+        return '', []
+    created_at, cursor_source, cursor_id = cursor
+    if source < cursor_source:
+        return " AND created_at <= ?", [created_at]
+    if source > cursor_source:
+        return " AND created_at < ?", [created_at]
+    return " AND (created_at, id) < (?, ?)", [created_at, cursor_id]
+
+def fetch_notifications(c, user_email, cursor=None, page_size=NOTIFICATION_PAGE_SIZE, archived=False):
+    """One page of a user's notifications, newest first, with keyset pagination.
+
+    The user's own notifications are merged with broadcasts they have not
+    cleared; each source is read with its own indexed LIMIT query. Returns
+    (rows, next_cursor); next_cursor is None on the last page. Rows have the
+    notifications columns whether they come from the archive or a broadcast.
+    """
+    table = 'notifications_archive' if archived else 'notifications'
+    # One extra row per source tells us whether there is a next page
+    condition, params = _after_cursor(cursor, 0)
+    c.execute(f'''
+        SELECT id, user_email, message, type, read, created_at
+        FROM {table}
+        WHERE user_email = ?{condition}
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', [user_email, *params, page_size + 1])
+    rows = [(row, 0) for row in c.fetchall()]
+    
+    # Broadcasts are never archived; they are append-only, so id order is created_at order
+    if not archived:
+        condition, params = _after_cursor(cursor, 1)
+        c.execute(f'''
+            SELECT id, ?, message, type,
+                id <= COALESCE((SELECT last_seen_id FROM broadcast_cursors WHERE user_email = ?), 0),
+                created_at
+            FROM broadcasts
+            WHERE id > COALESCE((SELECT cleared_id FROM broadcast_cursors WHERE user_email = ?), 0){condition}
+            ORDER BY id DESC LIMIT ?
+        ''', [user_email, user_email, user_email, *params, page_size + 1])
+        rows += [(row, 1) for row in c.fetchall()]
+        rows.sort(key=lambda item: (item[0][5], item[1], item[0][0]), reverse=True)
+    
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last, source = rows[-1]
+        next_cursor = (last[5], source, last[0])
+    return [row for row, _ in rows], next_cursor
+
 # Utility functions
 def create_folder_structure():
     """Create necessary folders for the application"""
@@ -681,6 +2227,11 @@ def create_folder_structure():
         if not os.path.exists(folder):
             os.makedirs(folder)
 
+def build_search_query(search):
+    """Build an FTS5 prefix query from free text, e.g. 'lambo ur' -> '"lambo"* "ur"*'"""
+    terms = re.findall(r'\w+', search or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
 def format_currency(amount):
     """Format amount as AED currency"""
     return f"AED {amount:,.2f}"
@@ -725,25 +2276,187 @@ def get_damage_types():
     ]
 
 # Image handling functions
+# Uploaded images live on disk under their sha256; the database only keeps the hash
+IMAGE_STORE_DIR = os.path.join('images', 'store')
+
+# Images can be served by a small HTTP sidecar. It is only used once IMAGE_BASE_URL
+# says where browsers reach it (e.g. a reverse proxy path on the app's origin);
+# until then images are sent inline as data: URIs, which work from any browser
+IMAGE_BASE_URL = os.environ.get('IMAGE_BASE_URL', '').rstrip('/')
+SERVE_IMAGES_INLINE = not IMAGE_BASE_URL
+IMAGE_SERVER_PORT = int(os.environ.get('IMAGE_SERVER_PORT', '8502'))
+# The sidecar has no authentication, so it listens on loopback for a proxy in front;
+# set IMAGE_SERVER_HOST=0.0.0.0 to expose it directly
+IMAGE_SERVER_HOST = os.environ.get('IMAGE_SERVER_HOST', '127.0.0.1')
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Rendition name -> (max width, max height, JPEG quality, crop to square)
+IMAGE_RENDITIONS = {
+    'full': (1200, 1200, 85, False),
+    'gallery': (800, 800, 82, False),
+    'card': (320, 320, 78, False),
+    'avatar': (160, 160, 80, True),
+}
+
+def is_image_hash(image_ref):
+    """Check whether a stored image reference is a content hash"""
+    return bool(image_ref) and re.fullmatch(r'[0-9a-f]{64}', image_ref) is not None
+
+def image_store_path(image_hash, rendition='full'):
+    """Get the fan-out path for an image rendition, e.g. images/store/ab/cd/abcd..._card.jpg"""
+    suffix = '' if rendition == 'full' else f"_{rendition}"
+    return os.path.join(IMAGE_STORE_DIR, image_hash[:2], image_hash[2:4], f"{image_hash}{suffix}.jpg")
+
+def _write_image_file(path, data):
+    # Write to a temp file first so readers never see a partial image
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def encode_rendition(image, rendition):
+    """Resize an RGB image for a rendition and return the JPEG bytes"""
+    max_width, max_height, quality, square = IMAGE_RENDITIONS[rendition]
+    if square:
+        image = ImageOps.fit(image, (max_width, max_height), Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail((max_width, max_height), Image.LANCZOS)
+    
+    # Saving without exif= drops all metadata from the output
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return img_byte_arr.getvalue()
+
+def store_image_bytes(data):
+    """Write JPEG bytes to the image store and return their sha256 hash"""
+    image_hash = hashlib.sha256(data).hexdigest()
+    path = image_store_path(image_hash)
+    
+    # Identical uploads share one file
+    if not os.path.exists(path):
+        _write_image_file(path, data)
+    
+    return image_hash
+
+def ensure_rendition(image_hash, rendition):
+    """Get the path of a rendition, generating it from the full image if missing"""
+    path = image_store_path(image_hash, rendition)
+    if rendition != 'full' and not os.path.exists(path):
+        with Image.open(image_store_path(image_hash)) as image:
+            _write_image_file(path, encode_rendition(image.convert('RGB'), rendition))
+    return path
+
+def load_image_bytes(image_ref, rendition='full'):
+    """Load image bytes for a stored hash (or a legacy base64 value)"""
+    try:
+        if is_image_hash(image_ref):
+            with open(ensure_rendition(image_ref, rendition), 'rb') as f:
+                return f.read()
+        return base64.b64decode(image_ref)
+    except (OSError, ValueError) as e:
+        print(f"Error loading image: {e}")
+        return None
+
+def image_src(image_ref, rendition='full'):
+    """Get an image source usable in markup and st.image for a stored image"""
+    if not image_ref:
+        return ''
+    
+    # Stored images are fetched (and cached) by the browser from the image server
+    if is_image_hash(image_ref) and not SERVE_IMAGES_INLINE:
+        return f"{IMAGE_BASE_URL}/img/{image_ref}/{rendition}.jpg"
+    
+    data = load_image_bytes(image_ref, rendition)
+    if data is None:
+        return ''
+    return f"data:image/jpeg;base64,{base64.b64encode(data).decode()}"
+
+class ImageRequestHandler(BaseHTTPRequestHandler):
+    """Serves /img/<hash>/<rendition>.jpg from the image store.
+
+    Content is addressed by hash, so a URL never changes meaning and the
+    browser may cache it for good.
+    """
+
+    path_pattern = re.compile(r'^/img/([0-9a-f]{64})/([a-z]+)\.jpg$')
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body):
+        match = self.path_pattern.match(self.path.split('?', 1)[0])
+        if not match or match.group(2) not in IMAGE_RENDITIONS:
+            self.send_error(404)
+            return
+        
+        image_hash, rendition = match.groups()
+        etag = f'"{image_hash}-{rendition}"'
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', IMAGE_CACHE_CONTROL)
+            self.end_headers()
+            return
+        
+        try:
+            with open(ensure_rendition(image_hash, rendition), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.send_error(404)
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', IMAGE_CACHE_CONTROL)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+@st.cache_resource(show_spinner=False)
+def start_image_server(port, host=IMAGE_SERVER_HOST):
+    """Start the image server thread once per process"""
+    try:
+        server = ThreadingHTTPServer((host, port), ImageRequestHandler)
+    except OSError as e:
+        # Another app process on this machine is already serving the same store
+        print(f"Image server not started on port {port}: {e}")
+        return None
+    
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='image-server', daemon=True).start()
+    print(f"Image server listening on {host}:{port}")
+    return server
+
 def save_uploaded_image(uploaded_file):
-    """Save uploaded image and return base64 string"""
+    """Save uploaded image and all its renditions to the image store and return its hash"""
     try:
         image = Image.open(uploaded_file)
-        # Resize image if too large
-        max_size = (1200, 1200)
-        image.thumbnail(max_size, Image.LANCZOS)
+        # Apply the camera orientation before the EXIF data is dropped
+        image = ImageOps.exif_transpose(image)
         
         # Convert to JPEG format
-        if image.mode in ('RGBA', 'P'):
+        if image.mode != 'RGB':
             image = image.convert('RGB')
-            
-        # Save to bytes
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='JPEG', quality=85)
-        img_byte_arr = img_byte_arr.getvalue()
         
-        # Convert to base64
-        return base64.b64encode(img_byte_arr).decode()
+        image_hash = store_image_bytes(encode_rendition(image, 'full'))
+        
+        # Generate the smaller renditions once, at upload time
+        for rendition in IMAGE_RENDITIONS:
+            path = image_store_path(image_hash, rendition)
+            if rendition != 'full' and not os.path.exists(path):
+                _write_image_file(path, encode_rendition(image, rendition))
+        
+        return image_hash
     except Exception as e:
         print(f"Error processing image: {e}")
         return None
@@ -891,13 +2604,14 @@ def browse_cars_page():
     with col2:
         if st.session_state.logged_in:
             # Get user info for profile display
-            user_info = get_user_info(st.session_state.user_email)
+            user = get_current_user()
+            user_info = user.info if user else None
             if user_info:
                 # Display profile picture if available, otherwise just name
                 if user_info[6]:  # profile_picture field
                     st.markdown(f"""
                         <div style="display: flex; align-items: center; justify-content: center; margin-bottom: 10px;">
-                            <img src="data:image/jpeg;base64,{user_info[6]}" class="profile-picture">
+                            <img src="{image_src(user_info[6], 'avatar')}" class="profile-picture" loading="lazy" decoding="async">
                         </div>
                         <div style="text-align: center; font-size: 0.8rem; margin-bottom: 5px;">
                             {user_info[1]}
@@ -911,7 +2625,7 @@ def browse_cars_page():
                     """, unsafe_allow_html=True)
                 
             # Notifications
-            unread_count = get_unread_notifications_count(st.session_state.user_email)
+            unread_count = user.unread_count if user else 0
             if unread_count > 0:
                 if st.button(f'🔔 ({unread_count})', key='notifications'):
                     st.session_state.current_page = 'notifications'
@@ -925,15 +2639,21 @@ def browse_cars_page():
     # Search and filters
     search = st.text_input('Search for your dream car', placeholder='e.g., "Lamborghini"')
     
-    # Category filters
+    # Category filters (kept in session state so they survive paging)
+    if 'browse_category' not in st.session_state:
+        st.session_state.browse_category = None
+    
     st.markdown("<h3 style='color: #4B0082; margin-top: 1rem;'>Categories</h3>", unsafe_allow_html=True)
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        luxury = st.button('🎯 Luxury', key='luxury_filter')
+        if st.button('🎯 Luxury', key='luxury_filter'):
+            toggle_browse_category('Luxury')
     with col2:
-        suv = st.button('🚙 SUV', key='suv_filter')
+        if st.button('🚙 SUV', key='suv_filter'):
+            toggle_browse_category('SUV')
     with col3:
-        sports = st.button('🏎 Sports', key='sports_filter')
+        if st.button('🏎 Sports', key='sports_filter'):
+            toggle_browse_category('Sports')
     with col4:
         if st.session_state.logged_in:
             if st.button('List Your Car', key='list_car'):
@@ -941,49 +2661,189 @@ def browse_cars_page():
             elif st.button('Subscription Plans', key='subscription_plans'):
                 st.session_state.current_page = 'subscription_plans'
     
+    # Availability dates; both must be set for the filter to apply. Dates kept in the
+    # session from an earlier day would now fail min_value, so clear them first
+    today = datetime.now().date()
+    if (st.session_state.get('browse_available_from') or today) < today:
+        st.session_state.browse_available_from = None
+    if (st.session_state.get('browse_available_to') or today) < (st.session_state.get('browse_available_from') or today):
+        st.session_state.browse_available_to = None
+    col1, col2 = st.columns(2)
+    with col1:
+        available_from = st.date_input('Available from', value=None, min_value=today, key='browse_available_from')
+    with col2:
+        available_to = st.date_input('Available until', value=None, min_value=available_from or today, key='browse_available_to')
+    available = (available_from, available_to) if available_from and available_to else None
+    
+    # Sorting and page size
+    sort_options = list(LISTING_SORT_OPTIONS)
+    if not build_search_query(search):
+        sort_options.remove('Best Match')
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        sort = st.selectbox('Sort by', sort_options, key='browse_sort')
+    with col2:
+        page_size = st.selectbox('Cars per page', LISTING_PAGE_SIZES, key='browse_page_size')
+    
     # Display cars
-    display_cars(search, luxury, suv, sports)
+    category = st.session_state.browse_category
+    display_cars(
+        search,
+        luxury=category == 'Luxury',
+        suv=category == 'SUV',
+        sports=category == 'Sports',
+        sort=sort,
+        page_size=page_size,
+        available=available
+    )
 
-def display_cars(search="", luxury=False, suv=False, sports=False):
-    conn = sqlite3.connect('car_rental.db')
-    c = conn.cursor()
+def toggle_browse_category(category):
+    """Select a browse category, or clear it when it is already selected"""
+    if st.session_state.browse_category == category:
+        st.session_state.browse_category = None
+    else:
+        st.session_state.browse_category = category
+
+# Browse page sort orders: label -> (sort expression, direction)
+# Each non-search order is backed by an index on (listing_status, column)
+LISTING_SORT_OPTIONS = {
+    'Best Match': ('fts.rank', 'ASC'),
+    'Newest': ('cl.created_at', 'DESC'),
+    'Price: Low to High': ('cl.price', 'ASC'),
+    'Price: High to Low': ('cl.price', 'DESC'),
+    'Year: Newest First': ('cl.year', 'DESC'),
+}
+LISTING_PAGE_SIZES = [12, 24, 48]
+
+def fetch_listings_page(c, categories=None, match_query='', sort='Newest', page_size=12, cursor=None, available=None):
+    """Fetch one page of approved listings with keyset pagination.
+
+    available is an optional (pickup_date, return_date) pair; cars with a
+    pending or confirmed booking overlapping it are left out. Returns
+    (rows, next_cursor); next_cursor is None on the last page. Each row is
+    car_listings.* followed by the primary image and the sort key.
+    """
+    if sort == 'Best Match' and not match_query:
+        sort = 'Newest'
+    sort_expr, direction = LISTING_SORT_OPTIONS[sort]
     
     # Get approved listings with primary images
-    query = '''
-        SELECT cl.*, li.image_data
+    query = f'''
+        SELECT cl.*, li.image_data, {sort_expr} AS sort_key
         FROM car_listings cl
+    '''
+    if match_query:
+        query += " JOIN car_listings_fts fts ON fts.rowid = cl.id"
+    query += '''
         LEFT JOIN listing_images li ON cl.id = li.listing_id AND li.is_primary = TRUE
         WHERE cl.listing_status = 'approved'
     '''
+    params = []
     
     # Add category filters
-    if any([luxury, suv, sports]):
-        categories = []
-        if luxury:
-            categories.append('Luxury')
-        if suv:
-            categories.append('SUV')
-        if sports:
-            categories.append('Sports')
+    if categories:
         query += f" AND cl.category IN ({','.join(['?']*len(categories))})"
-        params = categories
-    else:
-        params = []
+        params.extend(categories)
     
     # Add search filter
-    if search:
-        query += " AND (cl.model LIKE ? OR cl.description LIKE ?)"
-        params.extend([f"%{search}%", f"%{search}%"])
+    if match_query:
+        query += " AND car_listings_fts MATCH ?"
+        params.append(match_query)
+    
+    # Anti-join against the availability index: one R*Tree window query per candidate car
+    if available:
+        query += '''
+            AND NOT EXISTS (
+                SELECT 1 FROM booking_intervals bi
+                WHERE bi.car_min <= cl.id AND bi.car_max >= cl.id
+                    AND bi.first_day <= ? AND bi.last_day >= ?
+            )
+        '''
+        pickup_date, return_date = available
+        params.extend([day_number(return_date), day_number(pickup_date)])
     
-    query += " ORDER BY cl.created_at DESC"
+    # Continue after the last row of the previous page
+    if cursor:
+        comparison = '<' if direction == 'DESC' else '>'
+        query += f" AND ({sort_expr}, cl.id) {comparison} (?, ?)"
+        params.extend(cursor)
+    
+    # One extra row tells us whether there is a next page
+    query += f" ORDER BY {sort_expr} {direction}, cl.id {direction} LIMIT ?"
+    params.append(page_size + 1)
     
     c.execute(query, params)
-    listings = c.fetchall()
+    rows = c.fetchall()
+    
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][12], rows[-1][0])
+    return rows, next_cursor
+
+def load_listings_page(categories, match_query, sort, page_size, cursor, available=None):
+    """fetch_listings_page through the read cache.
+
+    Listing writes invalidate ('catalog',); booking writes invalidate only
+    the date-filtered pages under ('catalog', 'available').
+    """
+    def load():
+        conn = get_db_connection()
+        try:
+            rows, next_cursor = fetch_listings_page(conn.cursor(), categories, match_query, sort, page_size, cursor, available)
+            return tuple(rows), next_cursor
+        finally:
+            conn.close()
+    
+    key = (tuple(categories), match_query, sort, page_size, cursor)
+    if available:
+        key = ('catalog', 'available', tuple(available)) + key
+    else:
+        key = ('catalog',) + key
+    return get_read_cache().get_or_load(key, load)
+
+def display_cars(search="", luxury=False, suv=False, sports=False, sort='Newest', page_size=12, available=None):
+    # Full-text search goes through the FTS5 index instead of LIKE scans
+    match_query = build_search_query(search)
+    
+    categories = []
+    if luxury:
+        categories.append('Luxury')
+    if suv:
+        categories.append('SUV')
+    if sports:
+        categories.append('Sports')
+    
+    # Start from the first page whenever the filters change
+    page_key = (match_query, tuple(categories), sort, page_size, available)
+    if st.session_state.get('browse_page_key') != page_key:
+        st.session_state.browse_page_key = page_key
+        st.session_state.browse_cursors = [None]
+    cursor = st.session_state.browse_cursors[-1]
+    
+    listings, next_cursor = load_listings_page(categories, match_query, sort, page_size, cursor, available)
     
     if not listings:
-        st.info("No cars found matching your criteria.")
+        st.info("No cars available for these dates." if available else "No cars found matching your criteria.")
         return
     
+    # Quote the searched dates for every car on the page in one vectorized pass
+    totals = {}
+    if available:
+        user = get_current_user()
+        listing_ids = [listing[0] for listing in listings]
+        quotes = pricing.quote_many(
+            pd.DataFrame({
+                'listing_id': listing_ids,
+                'daily_rate': [listing[4] for listing in listings],
+                'pickup_day': day_number(available[0]),
+                'return_day': day_number(available[1]),
+            }),
+            load_pricing_rules(listing_ids),
+            user.subscription_type if user else None
+        )
+        totals = dict(zip(listing_ids, quotes['total']))
+    
     # Group listings by category
     categorized_listings = {}
     for listing in listings:
@@ -1002,9 +2862,10 @@ def display_cars(search="", luxury=False, suv=False, sports=False):
                 specs = json.loads(car[8])  # Parse specs JSON
                 st.markdown(f"""
                     <div class='car-card'>
-                        <img src='data:image/jpeg;base64,{car[11]}' style='width: 100%; height: 250px; object-fit: cover; border-radius: 10px;'>
+                        <img src='{image_src(car[11], 'card')}' loading='lazy' decoding='async' style='width: 100%; height: 250px; object-fit: cover; border-radius: 10px;'>
                         <h3 style='color: #4B0082; margin: 1rem 0;'>{car[2]} ({car[3]})</h3>
                         <p style='color: #666;'>{format_currency(car[4])}/day</p>
+                        {f"<p style='color: #4B0082; font-weight: 600;'>{format_currency(totals[car[0]])} total for your dates</p>" if car[0] in totals else ''}
                         <p style='color: #666;'>{car[5]}</p>
                         <div style='color: #666; font-size: 0.9rem;'>
                             <p>🏎 {specs['engine']}</p>
@@ -1026,9 +2887,20 @@ def display_cars(search="", luxury=False, suv=False, sports=False):
                     }
                     st.session_state.current_page = 'car_details'
                     st.rerun()
-                 
     
-    conn.close()
+    # Pagination controls
+    page_number = len(st.session_state.browse_cursors)
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if page_number > 1 and st.button('← Previous', key='browse_prev'):
+            st.session_state.browse_cursors.pop()
+            st.rerun()
+    with col2:
+        st.markdown(f"<p style='text-align: center; color: #666;'>Page {page_number}</p>", unsafe_allow_html=True)
+    with col3:
+        if next_cursor and st.button('Next →', key='browse_next'):
+            st.session_state.browse_cursors.append(next_cursor)
+            st.rerun()
 
 
 def subscription_plans_page():
@@ -1038,21 +2910,13 @@ def subscription_plans_page():
         st.session_state.current_page = 'browse_cars'
     
     # Get user info
-    user_info = get_user_info(st.session_state.user_email)
+    user_info = get_current_user_info()
     current_plan = user_info[7] if user_info else 'free_renter'
     
     # Check if user is primarily a renter or host based on history
-    conn = sqlite3.connect('car_rental.db')
-    c = conn.cursor()
-    
-    # Count bookings vs listings
-    c.execute('SELECT COUNT(*) FROM bookings WHERE user_email = ?', (st.session_state.user_email,))
-    booking_count = c.fetchone()[0]
-    
-    c.execute('SELECT COUNT(*) FROM car_listings WHERE owner_email = ?', (st.session_state.user_email,))
-    listing_count = c.fetchone()[0]
-    
-    conn.close()
+    user = get_current_user()
+    booking_count = user.booking_count if user else 0
+    listing_count = user.listing_count if user else 0
     
     # Determine if user is primarily a renter or host
     user_type = 'renter' if booking_count >= listing_count else 'host'
@@ -1240,7 +3104,7 @@ def insurance_claims_page():
         st.markdown("<h3>Submit New Insurance Claim</h3>", unsafe_allow_html=True)
         
         # Get user's bookings that have insurance
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
         c.execute('''
             SELECT b.id, cl.model, cl.year, b.pickup_date, b.return_date
@@ -1259,7 +3123,7 @@ def insurance_claims_page():
         # Create claim form
         with st.form("claim_form"):
             # Choose booking
-            booking_options = [f"#{b[0]} - {b[1]} ({b[2]}) - {b[3]} to {b[4]}" for b in insured_bookings]
+            booking_options = [f"#{b[0]} - {b[1]} ({b[2]}) - {format_day(b[3])} to {format_day(b[4])}" for b in insured_bookings]
             selected_booking = st.selectbox("Select Insured Booking", booking_options)
             booking_id = int(selected_booking.split('#')[1].split(' ')[0])
             
@@ -1324,7 +3188,7 @@ def insurance_claims_page():
         st.markdown("<h3>My Insurance Claims</h3>", unsafe_allow_html=True)
         
         # Get user's claims
-        conn = sqlite3.connect('car_rental.db')
+        conn = get_db_connection()
         c = conn.cursor()
         c.execute('''
             SELECT ic.*, b.car_id, cl.model, cl.year  
@@ -1346,7 +3210,7 @@ def insurance_claims_page():
             with st.container():
                 claim_id = claim[0]
                 booking_id = claim[1]
-                incident_date = claim[3]
+                incident_date = format_day(claim[4])
                 damage_type = claim[6]
                 claim_amount = claim[7]
                 status = claim[9]
@@ -1386,7 +3250,7 @@ def insurance_claims_page():
                             cols = st.columns(min(len(evidence_images), 3))
                             for i, img_data in enumerate(evidence_images):
                                 with cols[i % 3]:
-                                    st.image(f"data:image/jpeg;base64,{img_data}", use_column_width=True)
+                                    st.image(image_src(img_data, 'gallery'), use_column_width=True)
                     except json.JSONDecodeError:
                         st.error("Error loading evidence images")
                 
@@ -1403,6 +3267,19 @@ def insurance_claims_page():
    
 
 
+def load_gallery(listing_id):
+    """All image refs of a listing, through the read cache"""
+    def load():
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            c.execute('SELECT image_data FROM listing_images WHERE listing_id = ?', (listing_id,))
+            return tuple(c.fetchall())
+        finally:
+            conn.close()
+    
+    return get_read_cache().get_or_load(('gallery', listing_id), load)
+
 def show_car_details(car):
     # Add a Go Back button
     col1, col2 = st.columns([1,7])
@@ -1415,11 +3292,7 @@ def show_car_details(car):
     st.markdown(f"<h1>{car['model']} ({car['year']})</h1>", unsafe_allow_html=True)
     
     # Fetch all images for this car
-    conn = sqlite3.connect('car_rental.db')
-    c = conn.cursor()
-    c.execute('SELECT image_data FROM listing_images WHERE listing_id = ?', (car['id'],))
-    images = c.fetchall()
-    conn.close()
+    images = load_gallery(car['id'])
     
     # Image gallery
     if images:
@@ -1428,7 +3301,7 @@ def show_car_details(car):
         for idx, (img_data,) in enumerate(images):
             with cols[idx]:
                 st.image(
-                    f"data:image/jpeg;base64,{img_data}", 
+                    image_src(img_data, 'gallery'), 
                     caption=f"Image {idx+1}",
                     use_container_width=True
                 )
@@ -1478,26 +3351,11 @@ def book_car_page():
     car = st.session_state.selected_car
     
     # Get user subscription info for possible discounts
-    user_info = get_user_info(st.session_state.user_email)
+    user_info = get_current_user_info()
     subscription_type = user_info[7] if user_info else 'free_renter'
     
     st.markdown(f"<h1>Book {car['model']} ({car['year']})</h1>", unsafe_allow_html=True)
     
-    # Define service prices
-    service_prices = {
-        'insurance': 50,  # per day
-        'driver': 100,    # per day
-        'delivery': 200,  # flat rate
-        'vip_service': 300  # flat rate
-    }
-    
-    # Apply subscription discounts if applicable
-    discount_percentage = 0
-    if subscription_type == 'premium_renter':
-        discount_percentage = 10
-    elif subscription_type == 'elite_renter':
-        discount_percentage = 20
-    
     # Booking form
     with st.form("booking_form"):
         st.markdown("### Booking Details")
@@ -1505,118 +3363,125 @@ def book_car_page():
         # Date selection
         col1, col2 = st.columns(2)
         with col1:
-            pickup_date = st.date_input("Pickup Date", min_value=datetime.now().date())
+            # Start from the dates searched on the browse page, if any and not yet past
+            today = datetime.now().date()
+            pickup_date = st.date_input(
+                "Pickup Date",
+                value=max(st.session_state.get('browse_available_from') or today, today),
+                min_value=today
+            )
         with col2:
-            return_date = st.date_input("Return Date", min_value=pickup_date)
+            return_date = st.date_input(
+                "Return Date",
+                value=max(st.session_state.get('browse_available_to') or pickup_date, pickup_date),
+                min_value=pickup_date
+            )
         
         # Location
         location = st.selectbox("Pickup Location", get_location_options())
         
         # Additional Services
         st.markdown("### Additional Services")
+        selected = {}
         col1, col2, col3 = st.columns(3)
         with col1:
-            insurance = st.checkbox(f"Insurance (AED {service_prices['insurance']}/day)")
+            selected['insurance'] = st.checkbox(pricing.describe_service('insurance'))
         with col2:
-            driver = st.checkbox(f"Driver (AED {service_prices['driver']}/day)")
+            selected['driver'] = st.checkbox(pricing.describe_service('driver'))
         with col3:
-            delivery = st.checkbox(f"Delivery (Flat AED {service_prices['delivery']})")
-        
-        vip_service = st.checkbox(f"VIP Service (Flat AED {service_prices['vip_service']})")
-        
-        # Calculate total price
-        rental_days = (return_date - pickup_date).days + 1
-        base_price = car['price'] * rental_days
-        
-        # Additional service costs
-        insurance_price = service_prices['insurance'] * rental_days if insurance else 0
-        driver_price = service_prices['driver'] * rental_days if driver else 0
-        delivery_price = service_prices['delivery'] if delivery else 0
-        vip_service_price = service_prices['vip_service'] if vip_service else 0
+            selected['delivery'] = st.checkbox(pricing.describe_service('delivery'))
         
-        subtotal = base_price + insurance_price + driver_price + delivery_price + vip_service_price
+        selected['vip_service'] = st.checkbox(pricing.describe_service('vip_service'))
         
-        # Apply subscription discount if applicable
-        discount_amount = 0
-        if discount_percentage > 0:
-            discount_amount = (subtotal * discount_percentage / 100)
-            total_price = subtotal - discount_amount
-        else:
-            total_price = subtotal
+        # Quote with the host's weekend and seasonal rules for this car
+        quote = pricing.quote(
+            car['price'],
+            day_number(pickup_date),
+            day_number(return_date),
+            [service for service, chosen in selected.items() if chosen],
+            load_pricing_rules([car['id']]),
+            subscription_type,
+            car['id']
+        )
         
         # Display price breakdown
         st.markdown("### Price Breakdown")
         col1, col2 = st.columns(2)
         with col1:
-            st.write(f"Base Rental ({rental_days} days): {format_currency(base_price)}")
-            if insurance:
-                st.write(f"Insurance: {format_currency(insurance_price)}")
-            if driver:
-                st.write(f"Driver: {format_currency(driver_price)}")
+            st.write(f"Base Rental ({quote.days} days): {format_currency(quote.base)}")
+            if quote.base != car['price'] * quote.days:
+                st.caption(f"Includes the host's weekend and seasonal rates (standard {format_currency(car['price'])}/day)")
+            for service in ('insurance', 'driver'):
+                if selected[service]:
+                    st.write(f"{pricing.SERVICE_LABELS[service]}: {format_currency(getattr(quote, service))}")
         with col2:
-            if delivery:
-                st.write(f"Delivery: {format_currency(delivery_price)}")
-            if vip_service:
-                st.write(f"VIP Service: {format_currency(vip_service_price)}")
+            for service in ('delivery', 'vip_service'):
+                if selected[service]:
+                    st.write(f"{pricing.SERVICE_LABELS[service]}: {format_currency(getattr(quote, service))}")
             
         # Show subscription discount if applicable
-        if discount_percentage > 0:
+        if quote.discount_pct > 0:
             st.markdown(f"""
                 <div style="background-color: #E8F5E9; padding: 10px; border-radius: 5px; margin: 10px 0;">
-                    <p><strong>{subscription_type.replace('_', ' ').title()} Discount ({discount_percentage}%):</strong> 
-                    {format_currency(discount_amount)}</p>
+                    <p><strong>{subscription_type.replace('_', ' ').title()} Discount ({quote.discount_pct:.0f}%):</strong> 
+                    {format_currency(quote.discount)}</p>
                 </div>
             """, unsafe_allow_html=True)
         
-        st.markdown(f"### Total Cost: {format_currency(total_price)}")
+        st.markdown(f"### Total Cost: {format_currency(quote.total)}")
         
         # Submit booking
         submit = st.form_submit_button("Confirm Booking")
         
         if submit:
             try:
-                conn = sqlite3.connect('car_rental.db')
+                conn = get_db_connection()
                 c = conn.cursor()
                 
+                # Hold the write lock from the availability check until the booking commits
+                c.execute('BEGIN IMMEDIATE')
+                conflicts = find_booking_conflicts(c, car['id'], pickup_date, return_date)
+                if conflicts:
+                    conn.rollback()
+                    _, booked_from, booked_to, _ = conflicts[0]
+                    st.error(f"This car is already booked from {format_day(booked_from)} to {format_day(booked_to)}. Please choose other dates.")
+                    return
+                
                 # Insert booking
                 c.execute('''
                     INSERT INTO bookings 
                     (user_email, car_id, pickup_date, return_date, location, 
                     total_price, insurance, driver, delivery, vip_service,
-                    insurance_price, driver_price, delivery_price, vip_service_price)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    insurance_price, driver_price, delivery_price, vip_service_price,
+                    base_price, discount_amount)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     st.session_state.user_email, 
                     car['id'], 
-                    pickup_date.strftime('%Y-%m-%d'), 
-                    return_date.strftime('%Y-%m-%d'), 
+                    day_number(pickup_date), 
+                    day_number(return_date), 
                     location, 
-                    total_price, 
-                    insurance, 
-                    driver, 
-                    delivery, 
-                    vip_service,
-                    insurance_price,
-                    driver_price,
-                    delivery_price,
-                    vip_service_price
+                    quote.total, 
+                    selected['insurance'], 
+                    selected['driver'], 
+                    selected['delivery'], 
+                    selected['vip_service'],
+                    quote.insurance,
+                    quote.driver,
+                    quote.delivery,
+                    quote.vip_service,
+                    quote.base,
+                    quote.discount
                 ))
                 
-                conn.commit()
-                
-                # Create notification for user
-                create_notification(
-                    st.session_state.user_email,
-                    f"Booking confirmed for {car['model']} from {pickup_date} to {return_date}",
-                    'booking_confirmed'
-                )
+                # Notify the renter and the car owner; both commit with the booking
+                create_notifications([
+                    (st.session_state.user_email, f"Booking confirmed for {car['model']} from {pickup_date} to {return_date}", 'booking_confirmed'),
+                    (car['owner_email'], f"New booking request for your {car['model']} from {pickup_date} to {return_date}", 'new_booking'),
+                ], conn)
                 
-                # Create notification for car owner
-                create_notification(
-                    car['owner_email'],
-                    f"New booking request for your {car['model']} from {pickup_date} to {return_date}",
-                    'new_booking'
-                )
+                conn.commit()
+                invalidate_cache('catalog', 'available')
                 
                 st.success("Booking confirmed successfully!")
                 
@@ -1644,20 +3509,11 @@ def my_bookings_page():
             st.session_state.current_page = 'insurance_claims'
     
     # Connect to database
-    conn = sqlite3.connect('car_rental.db')
+    conn = get_db_connection()
     c = conn.cursor()
     
     # Fetch user's bookings with car details and owner information
-    c.execute('''
-        SELECT b.*, cl.model, cl.year, cl.owner_email, li.image_data
-        FROM bookings b
-        JOIN car_listings cl ON b.car_id = cl.id
-        LEFT JOIN listing_images li ON cl.id = li.listing_id AND li.is_primary = TRUE
-        WHERE b.user_email = ?
-        ORDER BY b.created_at DESC
-    ''', (st.session_state.user_email,))
-    
-    bookings = c.fetchall()
+    bookings = fetch_user_bookings(c, st.session_state.user_email)
     
     # Clear bookings functionality
     with col2:
@@ -1672,6 +3528,8 @@ def my_bookings_page():
                         WHERE user_email = ? AND booking_status != 'pending'
                     ''', (st.session_state.user_email,))
                     conn.commit()
+                    invalidate_cache('user', st.session_state.user_email)
+                    invalidate_cache('catalog', 'available')
                     st.success("Completed bookings cleared!")
                     st.experimental_rerun()
                 except Exception as e:
@@ -1683,15 +3541,19 @@ def my_bookings_page():
         return
     
     # Get user's subscription type
-    user_info = get_user_info(st.session_state.user_email)
+    user_info = get_current_user_info()
     subscription_type = user_info[7] if user_info else 'free_renter'
     
+    # Find which bookings already have a claim, in one query
+    claimed_booking_ids = load_claimed_booking_ids(c, [booking[0] for booking in bookings])
+    
     for booking in bookings:
         # Unpack booking details
         (booking_id, user_email, car_id, pickup_date, return_date, location, 
          total_price, insurance, driver, delivery, vip_service, 
          booking_status, created_at, 
          insurance_price, driver_price, delivery_price, vip_service_price,
+         base_price, discount_amount,
          model, year, owner_email, image_data) = booking
         
         # Create a card-like container
@@ -1699,7 +3561,7 @@ def my_bookings_page():
             # Display car image if available
             if image_data:
                 st.image(
-                    f"data:image/jpeg;base64,{image_data}", 
+                    image_src(image_data, 'gallery'), 
                     use_container_width=True, 
                     caption=f"{model} ({year})"
                 )
@@ -1720,12 +3582,12 @@ def my_bookings_page():
             col1, col2 = st.columns(2)
             with col1:
                 st.write(f"**Booking ID:** #{booking_id}")
-                st.write(f"**Pickup Date:** {pickup_date}")
+                st.write(f"**Pickup Date:** {format_day(pickup_date)}")
                 st.write(f"**Location:** {location}")
                 st.write(f"**Owner Email:** {owner_email}")
             
             with col2:
-                st.write(f"**Return Date:** {return_date}")
+                st.write(f"**Return Date:** {format_day(return_date)}")
                 st.write(f"**Total Price:** {format_currency(total_price)}")
                 # Show subscription benefits if applicable
                 if subscription_type in ['premium_renter', 'elite_renter']:
@@ -1743,8 +3605,7 @@ def my_bookings_page():
             st.subheader("Price Breakdown")
             col1, col2 = st.columns(2)
             with col1:
-                # Calculate base rental by subtracting additional services
-                base_price = total_price - (insurance_price + driver_price + delivery_price + vip_service_price)
+                # The breakdown quoted at booking time
                 st.write(f"Base Rental: {format_currency(base_price)}")
                 
                 if insurance:
@@ -1756,6 +3617,8 @@ def my_bookings_page():
                     st.write(f"Delivery: {format_currency(delivery_price)}")
                 if vip_service:
                     st.write(f"VIP Service: {format_currency(vip_service_price)}")
+                if discount_amount:
+                    st.write(f"Subscription Discount: -{format_currency(discount_amount)}")
             
             # Additional Services
             st.subheader("Additional Services")
@@ -1778,10 +3641,7 @@ def my_bookings_page():
             # Insurance claim button (only show for confirmed bookings with insurance)
             if booking_status.lower() == 'confirmed' and insurance:
                 # Check if a claim already exists
-                c.execute('SELECT id FROM insurance_claims WHERE booking_id = ?', (booking_id,))
-                existing_claim = c.fetchone()
-                
-                if not existing_claim:
+                if booking_id not in claimed_booking_ids:
                     if st.button(f"File Insurance Claim", key=f"claim_{booking_id}"):
                         st.session_state.selected_booking_for_claim = booking_id
                         st.session_state.current_page = 'insurance_claims'
@@ -1802,25 +3662,18 @@ def owner_bookings_page():
             st.session_state.current_page = 'browse_cars'
     
     # Connect to database
-    conn = sqlite3.connect('car_rental.db')
+    conn = get_db_connection()
     c = conn.cursor()
     
     # Get user's subscription type
-    user_info = get_user_info(st.session_state.user_email)
+    user_info = get_current_user_info()
     subscription_type = user_info[7] if user_info else 'free_host'
     subscription_benefits = get_subscription_benefits(subscription_type)
     
     # Fetch bookings for cars owned by the current user
-    c.execute('''
-        SELECT b.*, cl.model, cl.year, b.user_email as renter_email, li.image_data
-        FROM bookings b
-        JOIN car_listings cl ON b.car_id = cl.id
-        LEFT JOIN listing_images li ON cl.id = li.listing_id AND li.is_primary = TRUE
-        WHERE cl.owner_email = ?
-        ORDER BY b.created_at DESC
-    ''', (st.session_state.user_email,))
-    
-    bookings = c.fetchall()
+    bookings = fetch_owner_bookings(c, st.session_state.user_email)
+    # Overlapping bookings of the same car, for the pending ones awaiting a decision
+    conflicts = load_booking_conflicts(c, [b[0] for b in bookings if b[11] == 'pending'])
     
     # Clear bookings functionality
     with col2:
@@ -1838,6 +3691,7 @@ def owner_bookings_page():
                         ) AND booking_status != 'pending'
                     ''', (st.session_state.user_email,))
                     conn.commit()
+                    invalidate_cache('catalog', 'available')
                     st.success("Completed bookings cleared!")
                     st.experimental_rerun()
                 except Exception as e:
@@ -1865,6 +3719,7 @@ def owner_bookings_page():
          total_price, insurance, driver, delivery, vip_service, 
          booking_status, created_at, 
          insurance_price, driver_price, delivery_price, vip_service_price,
+         base_price, discount_amount,
          model, year, booking_renter_email, image_data) = booking
         
         # Create a container for each booking
@@ -1872,7 +3727,7 @@ def owner_bookings_page():
             # Display car image if available
             if image_data:
                 st.image(
-                    f"data:image/jpeg;base64,{image_data}", 
+                    image_src(image_data, 'gallery'), 
                     use_container_width=True, 
                     caption=f"{model} ({year})"
                 )
@@ -1894,21 +3749,14 @@ def owner_bookings_page():
             with col1:
                 st.write(f"**Booking ID:** #{booking_id}")
                 st.write(f"**Renter:** {renter_email}")
-                st.write(f"**Pickup Date:** {pickup_date}")
+                st.write(f"**Pickup Date:** {format_day(pickup_date)}")
                 st.write(f"**Location:** {location}")
             
             with col2:
-                st.write(f"**Return Date:** {return_date}")
+                st.write(f"**Return Date:** {format_day(return_date)}")
                 
-                # Calculate commission based on subscription
-                commission_rate = 0.15  # default 15%
-                if subscription_type == 'premium_host':
-                    commission_rate = 0.10
-                elif subscription_type == 'elite_host':
-                    commission_rate = 0.05
-                
-                commission = total_price * commission_rate
-                host_earnings = total_price - commission
+                # Platform commission depends on the host's subscription
+                commission_rate, commission, host_earnings = pricing.commission(total_price, subscription_type)
                 
                 st.write(f"**Total Booking Price:** {format_currency(total_price)}")
                 st.write(f"**Platform Fee ({int(commission_rate*100)}%):** {format_currency(commission)}")
@@ -1934,6 +3782,9 @@ def owner_bookings_page():
             
             # Approval buttons (only for pending bookings)
             if booking_status.lower() == 'pending':
+                for other_id, other_pickup, other_return, other_status in conflicts.get(booking_id, []):
+                    st.warning(f"⚠️ Overlaps {other_status} booking #{other_id} ({format_day(other_pickup)} to {format_day(other_return)})")
+                
                 col1, col2 = st.columns(2)
                 with col1:
                     approve = st.button("Approve Booking", key=f"approve_{booking_id}")
@@ -1943,43 +3794,51 @@ def owner_bookings_page():
                 if approve or reject:
                     new_status = 'confirmed' if approve else 'rejected'
                     
-                    # Update booking status
-                    c.execute('''
-                        UPDATE bookings 
-                        SET booking_status = ? 
-                        WHERE id = ?
-                    ''', (new_status, booking_id))
-                    
-                    # Create notification for renter
-                    create_notification(
-                        renter_email,
-                        f"Your booking for {model} has been {new_status}.",
-                        f'booking_{new_status}'
-                    )
-                    
-                    conn.commit()
-                    st.success(f"Booking {new_status}")
-                    st.experimental_rerun()
+                    # A car cannot be confirmed twice for the same days
+                    c.execute('BEGIN IMMEDIATE')
+                    if approve and find_booking_conflicts(c, car_id, pickup_date, return_date, booking_id, ('confirmed',)):
+                        conn.rollback()
+                        st.error("These dates overlap a confirmed booking; reject this request instead.")
+                    else:
+                        # Update booking status
+                        c.execute('''
+                            UPDATE bookings 
+                            SET booking_status = ? 
+                            WHERE id = ?
+                        ''', (new_status, booking_id))
+                        
+                        # Create notification for renter
+                        create_notification(
+                            renter_email,
+                            f"Your booking for {model} has been {new_status}.",
+                            f'booking_{new_status}',
+                            conn
+                        )
+                        
+                        conn.commit()
+                        invalidate_cache('catalog', 'available')
+                        st.success(f"Booking {new_status}")
+                        st.experimental_rerun()
             
             # Display payout info for confirmed bookings
             if booking_status.lower() == 'confirmed':
                 # Calculate payout date based on subscription
-                booking_date = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
-                
                 if subscription_type == 'elite_host':
-                    payout_date = booking_date.date()
-                    payout_msg = "Same-day payout"
+                    payout_days, payout_msg = 0, "Same-day payout"
                 elif subscription_type == 'premium_host':
-                    payout_date = booking_date.date() + timedelta(days=1)
-                    payout_msg = "Next-day payout"
+                    payout_days, payout_msg = 1, "Next-day payout"
+                else:
+                    payout_days, payout_msg = 3, "Standard payout (3 days)"
+                # created_at is epoch seconds, unless the integer migration had to keep it as text
+                if isinstance(created_at, int):
+                    payout_date = day_to_date(created_at // 86400 + payout_days).strftime('%d %b %Y')
                 else:
-                    payout_date = booking_date.date() + timedelta(days=3)
-                    payout_msg = "Standard payout (3 days)"
+                    payout_date = "To be confirmed"
                 
                 st.markdown(f"""
                     <div style="background-color: #F0FFF0; padding: 10px; border-radius: 5px; margin-top: 10px;">
                         <p><strong>Payout Status:</strong> {payout_msg}</p>
-                        <p><strong>Payout Date:</strong> {payout_date.strftime('%d %b %Y')}</p>
+                        <p><strong>Payout Date:</strong> {payout_date}</p>
                         <p><strong>Amount:</strong> {format_currency(host_earnings)}</p>
                     </div>
                 """, unsafe_allow_html=True)
@@ -1996,7 +3855,7 @@ def admin_panel():
         st.session_state.current_page = 'browse_cars'
     
     # Navigation tabs
-    tab1, tab2, tab3, tab4 = st.tabs(["Pending Listings", "Approved Listings", "Rejected Listings", "Insurance Claims"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Pending Listings", "Approved Listings", "Rejected Listings", "Insurance Claims", "Broadcast", "Performance"])
     
     with tab1:
         show_pending_listings()
@@ -2006,11 +3865,92 @@ def admin_panel():
         show_rejected_listings()
     with tab4:
         show_admin_insurance_claims()
+    with tab5:
+        show_broadcast_form()
+    with tab6:
+        show_performance_panel()
+
+def show_broadcast_form():
+    st.subheader("Broadcast to All Users")
+    st.caption("Appears in every user's notifications and unread count")
+    
+    with st.form("broadcast_form", clear_on_submit=True):
+        message = st.text_area("Message", max_chars=500)
+        if st.form_submit_button("Send Broadcast"):
+            if not message.strip():
+                st.error("Please enter a message")
+            elif create_broadcast(message.strip(), st.session_state.user_email):
+                st.success("Broadcast sent to all users")
+            else:
+                st.error("Error sending broadcast")
+
+def show_performance_panel():
+    st.subheader("Read Cache")
+    
+    stats = get_read_cache().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Hit Ratio", f"{stats['hit_ratio']:.1%}")
+    col2.metric("Entries", stats['entries'])
+    col3.metric("Memory", f"{stats['size_bytes'] / 1024 / 1024:.1f} / {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+    col4.metric("Evictions", stats['evictions'])
+    st.write(
+        f"Hits: {stats['hits']} · Misses: {stats['misses']} · "
+        f"Invalidated entries: {stats['invalidations']}"
+    )
+    
+    if st.button('Clear Cache', key='clear_read_cache'):
+        invalidate_cache()
+        st.rerun()
+
+    st.subheader("Query Trace")
+
+    tracer = get_query_tracer()
+    reruns = tracer.recent_reruns()
+    st.caption(
+        f"Last {len(reruns)} reruns across all sessions. Queries over {tracer.slow_ms:.0f} ms "
+        f"are also written to {SLOW_QUERY_LOG}."
+    )
+    if not reruns:
+        st.info("No reruns traced yet")
+        return
+
+    # Per page handler summary
+    pages = {}
+    for trace in reruns:
+        pages.setdefault(trace.page or '-', []).append(trace)
+    st.dataframe(pd.DataFrame([
+        {
+            'page': page,
+            'reruns': len(traces),
+            'avg queries': round(sum(len(t.queries) for t in traces) / len(traces), 1),
+            'max queries': max(len(t.queries) for t in traces),
+            'avg query ms': round(sum(q.ms for t in traces for q in t.queries) / len(traces), 1),
+            'avg rerun ms': round(sum(t.ms for t in traces) / len(traces), 1),
+        }
+        for page, traces in sorted(pages.items())
+    ]), hide_index=True)
+
+    # Newest reruns first, one expander each
+    shown = st.number_input("Reruns to show", min_value=1, max_value=len(reruns), value=min(10, len(reruns)), key='query_trace_count')
+    for trace in reversed(reruns[-shown:]):
+        query_ms = sum(q.ms for q in trace.queries)
+        label = (
+            f"{trace.started_at:%H:%M:%S} · {trace.page or '-'} · {trace.user_email or 'anonymous'} · "
+            f"{len(trace.queries)} queries, {query_ms:.1f} ms of {trace.ms:.0f} ms"
+        )
+        with st.expander(label):
+            if trace.queries:
+                st.dataframe(pd.DataFrame([
+                    {'handler': q.handler, 'ms': round(q.ms, 2), 'rows': q.rows, 'params': q.params, 'sql': q.sql}
+                    for q in trace.queries
+                ]), hide_index=True)
+            else:
+                st.write("No queries")
 
 def show_pending_listings():
     st.subheader("Pending Listings")
     
-    conn = sqlite3.connect('car_rental.db')
+    conn = get_db_connection()
     c = conn.cursor()
     
     # Get pending listings
@@ -2027,11 +3967,12 @@ def show_pending_listings():
     if not pending_listings:
         st.info("No pending listings to review")
     else:
+        # Get images for all pending listings in one query
+        listing_images = load_listing_images(c, [listing[0] for listing in pending_listings])
+        
         for listing in pending_listings:
             with st.container():
-                # Get images for this listing
-                c.execute('SELECT * FROM listing_images WHERE listing_id = ?', (listing[0],))
-                images = c.fetchall()
+                images = listing_images.get(listing[0], [])
                 
                 st.markdown(f"""
                     <div class='admin-review-card'>
@@ -2052,7 +3993,7 @@ def show_pending_listings():
                     for idx, img in enumerate(images):
                         with cols[idx]:
                             st.image(
-                                f"data:image/jpeg;base64,{img[2]}", 
+                                image_src(img[2], 'gallery'), 
                                 caption=f"Image {idx+1}",
                                 use_container_width=True
                             )
@@ -2093,17 +4034,19 @@ def show_pending_listings():
                         create_notification(
                             listing[12],
                             f"Your listing for {listing[2]} has been {status}. {comment if comment else ''}",
-                            f'listing_{status}'
+                            f'listing_{status}',
+                            conn
                         )
                         
                         conn.commit()
+                        invalidate_cache('catalog')
                         st.success(f"Listing has been {status}")
                         st.rerun()
     
     conn.close()
 
 def show_listings_by_status(status):
-    conn = sqlite3.connect('car_rental.db')
+    conn = get_db_connection()
     c = conn.cursor()
     
     c.execute('''
@@ -2120,11 +4063,12 @@ def show_listings_by_status(status):
     if not listings:
         st.info(f"No {status} listings")
     else:
+        # Get images for all listings in one query
+        listing_images = load_listing_images(c, [listing[0] for listing in listings])
+        
         for listing in listings:
             with st.container():
-                # Get images
-                c.execute('SELECT * FROM listing_images WHERE listing_id = ?', (listing[0],))
-                images = c.fetchall()
+                images = listing_images.get(listing[0], [])
                 
                 st.markdown(f"""
                     <div class='admin-review-card'>
@@ -2143,7 +4087,7 @@ def show_listings_by_status(status):
                     for idx, img in enumerate(images):
                         with cols[idx]:
                             st.image(
-                                f"data:image/jpeg;base64,{img[2]}", 
+                                image_src(img[2], 'card'), 
                                 caption=f"Image {idx+1}",
                                 use_container_width=True
                             )
@@ -2162,20 +4106,11 @@ def show_rejected_listings():
 def show_admin_insurance_claims():
     st.subheader("Insurance Claims Management")
     
-    conn = sqlite3.connect('car_rental.db')
+    conn = get_db_connection()
     c = conn.cursor()
     
     # Get all insurance claims
-    c.execute('''
-        SELECT ic.*, u.full_name, b.car_id, cl.model, cl.year
-        FROM insurance_claims ic
-        JOIN users u ON ic.user_email = u.email
-        JOIN bookings b ON ic.booking_id = b.id
-        JOIN car_listings cl ON b.car_id = cl.id
-        ORDER BY ic.claim_status = 'pending' DESC, ic.created_at DESC
-    ''')
-    
-    claims = c.fetchall()
+    claims = fetch_all_claims(c)
     
     if not claims:
         st.info("No insurance claims to review")
@@ -2213,7 +4148,7 @@ def display_admin_claim(claim, conn, c, show_actions=True):
     claim_id = claim[0]
     booking_id = claim[1]
     user_email = claim[2]
-    incident_date = claim[3]
+    incident_date = format_day(claim[4])
     description = claim[5]
     damage_type = claim[6]
     claim_amount = claim[7]
@@ -2260,7 +4195,7 @@ def display_admin_claim(claim, conn, c, show_actions=True):
                     cols = st.columns(min(len(images_data), 3))
                     for i, img_data in enumerate(images_data):
                         with cols[i % 3]:
-                            st.image(f"data:image/jpeg;base64,{img_data}", use_column_width=True)
+                            st.image(image_src(img_data, 'gallery'), use_column_width=True)
             except json.JSONDecodeError:
                 st.error("Error loading evidence images")
         
@@ -2302,13 +4237,13 @@ def list_your_car_page():
         st.session_state.current_page = 'browse_cars'
     
     # Get user's subscription type to display benefits
-    user_info = get_user_info(st.session_state.user_email)
+    user_info = get_current_user_info()
     subscription_type = user_info[7] if user_info else 'free_host'
     
     # Display subscription benefits for hosts
     if subscription_type.endswith('_host'):
         benefits = get_subscription_benefits(subscription_type)
-        commission_rate = '15%' if subscription_type == 'free_host' else '10%' if subscription_type == 'premium_host' else '5%'
+        commission_rate = f"{pricing.commission_rate(subscription_type):.0%}"
         
         st.markdown(f"""
             <div style="background-color: #E8F5E9; padding: 15px; border-radius: 10px; margin-bottom: 20px;">
@@ -2384,7 +4319,7 @@ def list_your_car_page():
                 st.error("Please fill in all required fields and accept terms and conditions")
             else:
                 try:
-                    conn = sqlite3.connect('car_rental.db')
+                    conn = get_db_connection()
                     c = conn.cursor()
                     
                     # Create specs dictionary
@@ -2426,15 +4361,17 @@ def list_your_car_page():
                                 VALUES (?, ?, ?)
                             ''', (listing_id, image_data, idx == 0))  # Only the first image is primary
                     
-                    conn.commit()
-                    
                     # Create notification
                     create_notification(
                         st.session_state.user_email,
                         f"Your listing for {model} has been submitted for review",
-                        'listing_submitted'
+                        'listing_submitted',
+                        conn
                     )
                     
+                    conn.commit()
+                    invalidate_cache('gallery', listing_id)
+                    
                     st.success("Your car has been listed successfully! Our team will review it shortly.")
                     time.sleep(2)  # Give user time to read the message
                     st.session_state.current_page = 'my_listings'
@@ -2455,16 +4392,16 @@ def my_listings_page():
         if st.button("+ List a New Car"):
             st.session_state.current_page = 'list_your_car'
     
-    conn = sqlite3.connect('car_rental.db')
+    conn = get_db_connection()
     c = conn.cursor()
     
-    # Get user's listings with their images
+    # Get user's listings with just the primary image; galleries load on demand
     c.execute('''
-        SELECT cl.*, GROUP_CONCAT(li.image_data) as images
+        SELECT cl.*, li.image_data,
+            (SELECT COUNT(*) FROM listing_images WHERE listing_id = cl.id) AS image_count
         FROM car_listings cl
-        LEFT JOIN listing_images li ON cl.id = li.listing_id
+        LEFT JOIN listing_images li ON cl.id = li.listing_id AND li.is_primary = TRUE
         WHERE cl.owner_email = ?
-        GROUP BY cl.id
         ORDER BY cl.created_at DESC
     ''', (st.session_state.user_email,))
     
@@ -2473,46 +4410,65 @@ def my_listings_page():
     if not listings:
         st.info("You haven't listed any cars yet.")
     else:
+        # Get the latest admin review for every listing in one query
+        latest_reviews = load_latest_reviews(c, [listing[0] for listing in listings])
+        
+        # Load full galleries only for the listings the owner has expanded
+        open_galleries = [listing[0] for listing in listings if st.session_state.get(f"gallery_{listing[0]}")]
+        gallery_images = load_listing_images(c, open_galleries) if open_galleries else {}
+        
+        # Host pricing rules for every listing in one query
+        pricing_rules = fetch_pricing_rules(c, [listing[0] for listing in listings])
+        rules_by_listing = dict(tuple(pricing_rules.groupby('listing_id')))
+        
+        # Demand-driven suggestions are a premium and elite host tool
+        user_info = get_current_user_info()
+        subscription_type = user_info[7] if user_info else 'free_host'
+        suggestion_days = pricing.SUGGESTION_HORIZONS.get(subscription_type)
+        if suggestion_days:
+            price_suggestions = load_price_suggestions(c, [listing[0] for listing in listings if listing[9] == 'approved'])
+        
         for listing in listings:
             with st.container():
-                st.markdown(f"""
-                    <div class='car-card'>
-                        <div style='display: flex; justify-content: space-between; align-items: center;'>
-                            <h3 style='color: #4B0082;'>{listing[2]} ({listing[3]})</h3>
-                            <span class='status-badge {listing[9].lower()}'>
-                                {listing[9].upper()}
-                            </span>
+                col1, col2 = st.columns([1, 3])
+                with col1:
+                    if listing[11]:  # Primary image
+                        st.image(image_src(listing[11], 'card'), use_container_width=True)
+                with col2:
+                    st.markdown(f"""
+                        <div class='car-card'>
+                            <div style='display: flex; justify-content: space-between; align-items: center;'>
+                                <h3 style='color: #4B0082;'>{listing[2]} ({listing[3]})</h3>
+                                <span class='status-badge {listing[9].lower()}'>
+                                    {listing[9].upper()}
+                                </span>
+                            </div>
+                            <p><strong>Price:</strong> {format_currency(listing[4])}/day</p>
+                            <p><strong>Location:</strong> {listing[5]}</p>
+                            <p><strong>Category:</strong> {listing[7]}</p>
+                            <p>{listing[6]}</p>
                         </div>
-                        <p><strong>Price:</strong> {format_currency(listing[4])}/day</p>
-                        <p><strong>Location:</strong> {listing[5]}</p>
-                        <p><strong>Category:</strong> {listing[7]}</p>
-                        <p>{listing[6]}</p>
-                    </div>
-                """, unsafe_allow_html=True)
+                    """, unsafe_allow_html=True)
                 
-                if listing[-1]:  # If there are images
-                    images = listing[-1].split(',')
+                image_count = listing[12]
+                if image_count > 1:
+                    st.checkbox(f"Show all {image_count} photos", key=f"gallery_{listing[0]}")
+                
+                images = gallery_images.get(listing[0])
+                if images:
                     st.markdown("<div class='image-gallery'>", unsafe_allow_html=True)
                     cols = st.columns(len(images))
-                    for idx, img_data in enumerate(images):
+                    for idx, img in enumerate(images):
                         with cols[idx]:
                             st.image(
-                                f"data:image/jpeg;base64,{img_data}",
+                                image_src(img[2], 'card'),
                                 caption=f"Image {idx+1}",
                                 use_container_width=True
                             )
                     st.markdown("</div>", unsafe_allow_html=True)
                 
                 # Get review if exists
-                c.execute('''
-                    SELECT comment, review_status, created_at
-                    FROM admin_reviews
-                    WHERE listing_id = ?
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                ''', (listing[0],))
-                
-                review = c.fetchone()
+                review = latest_reviews.get(listing[0])
                 if review:
                     st.markdown(f"""
                         <div style='background-color: #f8f9fa; padding: 1rem; border-radius: 10px; margin-top: 1rem;'>
@@ -2520,9 +4476,81 @@ def my_listings_page():
                             <small style='color: #666;'>Reviewed on {review[2]}</small>
                         </div>
                     """, unsafe_allow_html=True)
+                
+                show_pricing_rules(listing[0], rules_by_listing.get(listing[0]))
+                if suggestion_days and listing[9] == 'approved':
+                    show_price_suggestions(
+                        listing[4], price_suggestions.get(listing[0], [])[:suggestion_days],
+                        detailed=subscription_type == 'elite_host'
+                    )
     
     conn.close()
 
+def show_pricing_rules(listing_id, rules):
+    with st.expander("💲 Pricing Rules"):
+        st.caption("Adjust the daily rate on weekends or for a season; adjustments on the same day add up")
+        
+        if rules is not None:
+            for rule in rules.itertuples():
+                if rule.rule_type == 'weekend':
+                    label = f"Weekends: {rule.adjustment_pct:+.0f}%"
+                else:
+                    label = f"{format_day(rule.start_day)} to {format_day(rule.end_day)}: {rule.adjustment_pct:+.0f}%"
+                col1, col2 = st.columns([4, 1])
+                col1.write(label)
+                if col2.button("Remove", key=f"delete_rule_{rule.id}"):
+                    delete_pricing_rule(rule.id, st.session_state.user_email)
+                    st.rerun()
+        
+        with st.form(f"pricing_rule_form_{listing_id}", clear_on_submit=True):
+            col1, col2 = st.columns(2)
+            with col1:
+                rule_type = st.selectbox("Applies to", ["Weekends", "Season"])
+            with col2:
+                adjustment_pct = st.number_input("Adjustment (%)", min_value=-50, max_value=200, value=20, step=5)
+            col1, col2 = st.columns(2)
+            with col1:
+                season_start = st.date_input("Season start", value=None)
+            with col2:
+                season_end = st.date_input("Season end", value=None)
+            
+            if st.form_submit_button("Add Rule"):
+                if rule_type == "Season" and not (season_start and season_end and season_start <= season_end):
+                    st.error("Please choose the season's start and end dates")
+                else:
+                    if rule_type == "Weekends":
+                        success, message = add_pricing_rule(listing_id, st.session_state.user_email, 'weekend', adjustment_pct)
+                    else:
+                        success, message = add_pricing_rule(
+                            listing_id, st.session_state.user_email, 'season', adjustment_pct,
+                            day_number(season_start), day_number(season_end)
+                        )
+                    if success:
+                        st.rerun()
+                    else:
+                        st.error(message)
+
+def show_price_suggestions(daily_rate, suggestions, detailed=False):
+    with st.expander("📈 Suggested Prices"):
+        if not suggestions:
+            st.caption("Suggestions appear after the next nightly pricing update")
+            return
+        st.caption("Based on recent occupancy, how far ahead renters book, and day-of-week demand for similar cars in your area")
+        table = []
+        for day, suggested_price, multiplier, occupancy, lead_time, weekday_factor in (row[1:] for row in suggestions):
+            row = {
+                'Date': day_to_date(day).strftime('%a %d %b'),
+                'Suggested': format_currency(suggested_price),
+                'vs. your rate': f"{suggested_price / daily_rate - 1:+.0%}" if daily_rate else '',
+            }
+            # Elite hosts also see the demand signals behind each suggestion
+            if detailed:
+                row['Occupancy'] = f"{occupancy:.0%}" if occupancy is not None else '-'
+                row['Booked ahead'] = f"{lead_time:.0f} days" if lead_time is not None else '-'
+                row['Day of week'] = f"{weekday_factor:.2f}×" if weekday_factor is not None else '-'
+            table.append(row)
+        st.dataframe(pd.DataFrame(table), hide_index=True)
+
 
 def notifications_page():
     st.markdown("<h1>Notifications</h1>", unsafe_allow_html=True)
@@ -2532,20 +4560,23 @@ def notifications_page():
         if st.button('← Back to Browse', key='notifications_back'):
             st.session_state.current_page = 'browse_cars'
     
-    conn = sqlite3.connect('car_rental.db')
+    conn = get_db_connection()
     c = conn.cursor()
     
     # Mark all notifications as read when viewing
     mark_notifications_as_read(st.session_state.user_email)
     
-    # Fetch notifications
-    c.execute('''
-        SELECT * FROM notifications 
-        WHERE user_email = ? 
-        ORDER BY created_at DESC
-    ''', (st.session_state.user_email,))
+    # Older read notifications are archived; show them only when asked
+    archived = st.checkbox('Show archived notifications', key='notifications_archived')
+    
+    # Start from the newest page whenever the view changes
+    if st.session_state.get('notification_view') != archived:
+        st.session_state.notification_view = archived
+        st.session_state.notification_cursors = [None]
+    cursor = st.session_state.notification_cursors[-1]
     
-    notifications = c.fetchall()
+    # Fetch one page of notifications
+    notifications, next_cursor = fetch_notifications(c, st.session_state.user_email, cursor, archived=archived)
     
     # Clear notifications functionality
     with col2:
@@ -2556,7 +4587,14 @@ def notifications_page():
                         DELETE FROM notifications 
                         WHERE user_email = ?
                     ''', (st.session_state.user_email,))
+                    c.execute('''
+                        DELETE FROM notifications_archive 
+                        WHERE user_email = ?
+                    ''', (st.session_state.user_email,))
+                    # Broadcasts are shared, so hide them by moving the cursor instead
+                    advance_broadcast_cursor(c, st.session_state.user_email, 'cleared_id')
                     conn.commit()
+                    invalidate_cache('user', st.session_state.user_email)
                     st.success("Notifications cleared!")
                     st.experimental_rerun()
                 except Exception as e:
@@ -2565,7 +4603,7 @@ def notifications_page():
     conn.close()
     
     if not notifications:
-        st.info("No notifications")
+        st.info("No archived notifications" if archived else "No notifications")
         return
     
     for notif in notifications:
@@ -2582,7 +4620,8 @@ def notifications_page():
             'claim_rejected': 'red',
             'claim_partial': 'orange',
             'subscription_activated': 'teal',
-            'new_booking': 'blue'
+            'new_booking': 'blue',
+            'broadcast': 'navy'
         }
         
         color = notification_colors.get(notif[3], 'black')
@@ -2594,33 +4633,21 @@ def notifications_page():
                 <small style='color: #666;'>{notif[5]}</small>
             </div>
         """, unsafe_allow_html=True)
+    
+    # Pagination controls
+    page_number = len(st.session_state.notification_cursors)
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if page_number > 1 and st.button('← Newer', key='notifications_newer'):
+            st.session_state.notification_cursors.pop()
+            st.rerun()
+    with col2:
+        st.markdown(f"<p style='text-align: center; color: #666;'>Page {page_number}</p>", unsafe_allow_html=True)
+    with col3:
+        if next_cursor and st.button('Older →', key='notifications_older'):
+            st.session_state.notification_cursors.append(next_cursor)
+            st.rerun()
 
-def update_bookings_table():
-    try:
-        conn = sqlite3.connect('car_rental.db')
-        c = conn.cursor()
-        
-        # Check existing columns
-        c.execute("PRAGMA table_info(bookings)")
-        columns = [column[1] for column in c.fetchall()]
-        
-        # Add missing columns if they don't exist
-        if 'insurance_price' not in columns:
-            c.execute("ALTER TABLE bookings ADD COLUMN insurance_price REAL DEFAULT 0")
-        if 'driver_price' not in columns:
-            c.execute("ALTER TABLE bookings ADD COLUMN driver_price REAL DEFAULT 0")
-        if 'delivery_price' not in columns:
-            c.execute("ALTER TABLE bookings ADD COLUMN delivery_price REAL DEFAULT 0")
-        if 'vip_service_price' not in columns:
-            c.execute("ALTER TABLE bookings ADD COLUMN vip_service_price REAL DEFAULT 0")
-        
-        conn.commit()
-        print("Bookings table updated successfully")
-    except sqlite3.Error as e:
-        print(f"Database update error: {e}")
-    finally:
-        if conn:
-            conn.close()
 def about_us_page():
     st.markdown("<h1>About Luxury Car Rentals</h1>", unsafe_allow_html=True)
     
@@ -2712,31 +4739,24 @@ def persist_session():
     # If we're not logged in but we have persisted credentials, restore them
     if not st.session_state.logged_in and 'persisted' in st.session_state and 'last_email' in st.session_state:
         if st.session_state.last_email:
-            # Verify the user still exists in the database
-            try:
-                conn = sqlite3.connect('car_rental.db')
-                c = conn.cursor()
-                c.execute('SELECT * FROM users WHERE email = ?', (st.session_state.last_email,))
-                user = c.fetchone()
-                conn.close()
-                
-                if user:
-                    # Restore login state
-                    st.session_state.logged_in = True
-                    st.session_state.user_email = st.session_state.last_email
-                    print(f"Restored session for {st.session_state.user_email}")
-            except Exception as e:
-                print(f"Error restoring session: {e}")
+            # Restore login state; main() drops it again if the user no longer exists
+            st.session_state.logged_in = True
+            st.session_state.user_email = st.session_state.last_email
+            print(f"Restored session for {st.session_state.user_email}")
 def main():
-    # Create necessary folders
-    create_folder_structure()
-    
-    # Setup or update database
-    if not os.path.exists('car_rental.db'):
-        setup_database()
-    else:
-        update_bookings_table()
+    # Create folders, migrate the database and start the image server (once per process)
+    bootstrap_application(DB_PATH)
     
+    # Trace the queries of this rerun for the admin Performance tab
+    tracer = get_query_tracer()
+    tracer.begin_rerun(st.session_state.get('user_email'))
+    try:
+        render_app()
+    finally:
+        tracer.end_rerun()
+
+def render_app():
+    """Sidebar and page for one rerun"""
     # Persistent login state initialization
     if 'logged_in' not in st.session_state:
         st.session_state.logged_in = False
@@ -2750,17 +4770,14 @@ def main():
     # Call session persistence function 
     persist_session()
     
-    # Verify login persistence
+    # Load the user once per rerun; this also verifies login persistence
+    st.session_state.user_context = None
     if st.session_state.logged_in:
         try:
-            conn = sqlite3.connect('car_rental.db')
-            c = conn.cursor()
-            c.execute('SELECT * FROM users WHERE email = ?', (st.session_state.user_email,))
-            user = c.fetchone()
-            conn.close()
+            st.session_state.user_context = load_user_context(st.session_state.user_email)
             
             # If no user found, force logout
-            if not user:
+            if not st.session_state.user_context:
                 st.session_state.logged_in = False
                 st.session_state.user_email = None
                 st.session_state.current_page = 'welcome'
@@ -2771,14 +4788,15 @@ def main():
     if st.session_state.logged_in:
         with st.sidebar:
             # Get user info
-            user_info = get_user_info(st.session_state.user_email)
+            user = get_current_user()
+            user_info = user.info if user else None
             
             # Display profile section
             if user_info:
                 if user_info[6]:  # profile picture
                     st.markdown(f"""
                         <div style="display: flex; align-items: center; justify-content: center; margin-bottom: 15px;">
-                            <img src="data:image/jpeg;base64,{user_info[6]}" 
+                            <img src="{image_src(user_info[6], 'avatar')}" loading="lazy" decoding="async"
                                 style="width: 80px; height: 80px; border-radius: 50%; object-fit: cover; border: 3px solid #4B0082;">
                         </div>
                     """, unsafe_allow_html=True)
@@ -2800,7 +4818,7 @@ def main():
             st.markdown("### My Account")
             
             # Get user role
-            role = get_user_role(st.session_state.user_email)
+            role = user.role if user else 'user'
             
             # Admin panel for admin users
             if role == 'admin':
@@ -2826,7 +4844,7 @@ def main():
                     st.session_state.current_page = page
             
             # Notifications
-            unread_count = get_unread_notifications_count(st.session_state.user_email)
+            unread_count = user.unread_count if user else 0
             notification_label = f"🔔 Notifications ({unread_count})" if unread_count > 0 else "🔔 Notifications"
             if st.button(notification_label):
                 st.session_state.current_page = 'notifications'
@@ -2876,11 +4894,13 @@ def main():
     
     # Render the current page
     current_page = st.session_state.current_page
+    get_query_tracer().set_handler(current_page)
     
     if current_page in protected_pages:
         if st.session_state.logged_in:
             # Special handling for admin panel
-            if current_page == 'admin_panel' and get_user_role(st.session_state.user_email) != 'admin':
+            user = get_current_user()
+            if current_page == 'admin_panel' and (not user or user.role != 'admin'):
                 st.error("Access denied. Admin privileges required.")
                 st.session_state.current_page = 'browse_cars'
                 browse_cars_page()
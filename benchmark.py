@@ -0,0 +1,158 @@
+"""Time the data-layer queries behind the main pages at several database sizes.
+
+Seeds one database per scale with seed_data.py (kept in --data-dir and reused
+on later runs), runs each query --repeat times and writes p50/p95 latency,
+rows returned and SQLite VM steps to a JSON file. Pass --compare with an
+earlier results file to print the change per query.
+
+    python benchmark.py [--scales 1000 10000 100000 1000000] [--output benchmark_results.json]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app  # noqa: E402
+import seed_data  # noqa: E402
+
+# Progress handler granularity; VM steps are counted in units of this
+STEP_UNIT = 100
+
+def busiest(c, query):
+    c.execute(query)
+    row = c.fetchone()
+    return row[0] if row else None
+
+def walk_listings(c, sort, pages, categories=None, match_query=''):
+    """Fetch `pages` consecutive browse pages, like clicking Next"""
+    cursor, rows = None, []
+    for _ in range(pages):
+        rows, cursor = app.fetch_listings_page(c, categories, match_query, sort, 12, cursor)
+        if cursor is None:
+            break
+    return rows
+
+def benchmark_cases(c):
+    """(name, function(c) -> rows) for every page query under test"""
+    renter = busiest(c, 'SELECT user_email FROM bookings GROUP BY user_email ORDER BY COUNT(*) DESC LIMIT 1')
+    owner = busiest(c, 'SELECT owner_email FROM car_listings GROUP BY owner_email ORDER BY COUNT(*) DESC LIMIT 1')
+    reader = busiest(c, 'SELECT user_email FROM notifications GROUP BY user_email ORDER BY COUNT(*) DESC LIMIT 1')
+    search = app.build_search_query('porsche turbo')
+    return [
+        ('display_cars newest', lambda c: walk_listings(c, 'Newest', 1)),
+        ('display_cars newest page 5', lambda c: walk_listings(c, 'Newest', 5)),
+        ('display_cars price low to high', lambda c: walk_listings(c, 'Price: Low to High', 1)),
+        ('display_cars category filter', lambda c: walk_listings(c, 'Newest', 1, ['Sports', 'SUV'])),
+        ('display_cars search best match', lambda c: walk_listings(c, 'Best Match', 1, match_query=search)),
+        ('my_bookings_page', lambda c: app.fetch_user_bookings(c, renter)),
+        ('owner_bookings_page', lambda c: app.fetch_owner_bookings(c, owner)),
+        ('show_admin_insurance_claims', lambda c: app.fetch_all_claims(c)),
+        ('notifications_page', lambda c: app.fetch_notifications(c, reader)[0]),
+        ('notifications_page archived', lambda c: app.fetch_notifications(c, reader, archived=True)[0]),
+    ]
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def measure(conn, run, repeat):
+    c = conn.cursor()
+    run(c)  # warm the page cache
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = run(c)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Python's sqlite3 does not expose sqlite3_stmt_status, so rows scanned
+    # are approximated by virtual machine steps, counted on a separate run
+    steps = [0]
+    def count_step():
+        steps[0] += 1
+    conn.set_progress_handler(count_step, STEP_UNIT)
+    run(c)
+    conn.set_progress_handler(None, 0)
+
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'rows_returned': len(rows),
+        'vm_steps': steps[0] * STEP_UNIT,
+        'runs': repeat,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['scale'], r['query']): r for r in json.load(f)['results']}
+    print(f"\nChange vs {baseline_path} (p50):")
+    for result in results:
+        before = baseline.get((result['scale'], result['query']))
+        if before and before['p50_ms']:
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms']
+            print(f"  {result['scale']:>8} {result['query']:34s} {before['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms ({change:+.0%})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--data-dir', default='bench_data', help='where seeded databases are kept')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    os.makedirs(args.data_dir, exist_ok=True)
+    os.chdir(args.data_dir)  # the image store is relative to the working directory
+    results = []
+    for scale in args.scales:
+        db_path = f"seed_{scale}.db"
+        if not os.path.exists(db_path):
+            print(f"Seeding {db_path}...")
+            seed_data.generate(db_path, scale)
+
+        conn = sqlite3.connect(db_path)
+        for pragma in app.SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        app.run_migrations(conn)  # bring databases seeded by older commits up to date
+        app.archive_read_notifications(conn)  # the steady state the retention policy keeps
+
+        for name, run in benchmark_cases(conn.cursor()):
+            result = {'scale': scale, 'query': name, **measure(conn, run, args.repeat)}
+            results.append(result)
+            print(f"{scale:>8} {name:34s} p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+                  f"rows {result['rows_returned']:>6}  vm steps {result['vm_steps']:>10}")
+        conn.close()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'sqlite_version': sqlite3.sqlite_version,
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if baseline:
+        compare(results, baseline)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Fail if any query the app runs falls back to a full table scan.
+
+Builds a small database in a scratch directory, renders every page with
+Streamlit's AppTest and calls the data-layer helpers while recording each SQL
+statement, then runs EXPLAIN QUERY PLAN on every distinct statement.
+
+    python check_query_plans.py [-v]
+"""
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+ADMIN_EMAIL = 'admin@luxuryrentals.com'
+SEED_ROWS = 200
+
+# Full scans we accept: normalized SQL fragment -> reason
+ALLOWED_SCANS = {
+    "FROM insurance_claims ic JOIN users u": "admin claim review lists every claim",
+    "FROM demand_dirty_ranges": "the price suggestion job drains the whole queue",
+    "FROM demand_fleet": "one row per category and location, read whole by the price suggestion job",
+}
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|-?\b\d+(?:\.\d+)?(?:e[-+]?\d+)?\b")
+CHECKED_VERBS = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+statements = {}  # normalized SQL -> first expanded SQL seen
+
+def normalize(sql):
+    return ' '.join(LITERAL.sub('?', sql).split())
+
+def record(sql):
+    if sql.startswith('--') or "'main'." in sql:  # trigger markers, FTS5 shadow tables
+        return
+    verb = sql.lstrip().split(None, 1)[0].upper()
+    if verb not in CHECKED_VERBS or 'schema_version' in sql or 'sqlite_master' in sql:
+        return
+    if verb == 'INSERT' and 'SELECT' not in sql.upper():
+        return
+    statements.setdefault(normalize(sql), sql)
+
+def tracing_connect(*args, _connect=sqlite3.connect, **kwargs):
+    conn = _connect(*args, **kwargs)
+    conn.set_trace_callback(record)
+    return conn
+
+def pick_user(c, query):
+    c.execute(query)
+    return c.fetchone()[0]
+
+def exercise_helpers(app, renter):
+    """Call the data-layer functions directly, including the write paths"""
+    conn = app.get_db_connection()
+    c = conn.cursor()
+    for sort in app.LISTING_SORT_OPTIONS:
+        for match_query in ('', app.build_search_query('model')):
+            for categories in (None, ['Luxury', 'SUV']):
+                for available in (None, ('2026-11-01', '2026-11-05')):
+                    rows, cursor = app.fetch_listings_page(c, categories, match_query, sort, 5, available=available)
+                    if cursor:
+                        app.fetch_listings_page(c, categories, match_query, sort, 5, cursor, available)
+    app.load_listing_images(c, [1, 2, 3])
+    app.load_latest_reviews(c, [1, 2, 3])
+    app.load_claimed_booking_ids(c, [1, 2, 3])
+    app.load_booking_conflicts(c, [1, 2, 3])
+    app.find_booking_conflicts(c, 1, '2026-11-01', '2026-11-05', exclude_id=1)
+    app.load_price_suggestions(c, [1, 2, 3])
+    conn.close()
+
+    email = renter
+    app.verify_user(email, 'password')
+    app.get_user_role(email)
+    app.get_user_info(email)
+    app._query_user_context(email)
+    app.get_unread_notifications_count(email)
+    app.create_notification(email, 'Check', 'welcome')
+    app.create_broadcast('Check', 'admin@luxuryrentals.com')
+    app.mark_notifications_as_read(email)
+    app.update_user_subscription(email, 'premium_renter')
+    conn = app.get_db_connection()
+    booking_id = app.fetch_user_bookings(conn.cursor(), email)[0][0]
+    conn.close()
+    app.create_insurance_claim(booking_id, email, '2026-11-02', 'Dent', 'Dent', 200)
+    app.update_claim_status(1, 'approved', 'OK')
+
+    # The first refresh rebuilds every group; the second only replays the dirty ranges
+    for full in (True, False):
+        with app.get_db_connection() as conn:
+            app.refresh_price_suggestions(conn.cursor(), full=full)
+
+    conn = app.get_db_connection()
+    app.archive_read_notifications(conn)
+    for archived in (False, True):
+        rows, cursor = app.fetch_notifications(conn.cursor(), email, page_size=1, archived=archived)
+        if cursor:
+            app.fetch_notifications(conn.cursor(), email, cursor, page_size=1, archived=archived)
+    conn.close()
+
+def render_pages(renter, owner):
+    car = {
+        'id': 1, 'model': 'Model 1', 'year': 2020, 'price': 400.0, 'location': 'Dubai Marina',
+        'specs': '{}', 'image': None, 'owner_email': owner
+    }
+    cases = [
+        (None, 'browse_cars', {}),
+        (renter, 'browse_cars', {}),
+        (renter, 'browse_cars', {'browse_category': 'Sports'}),
+        (renter, 'my_bookings', {}),
+        (renter, 'insurance_claims', {}),
+        (renter, 'notifications', {}),
+        (renter, 'subscription_plans', {}),
+        (renter, 'car_details', {'selected_car': car}),
+        (renter, 'book_car', {'selected_car': car}),
+        (owner, 'owner_bookings', {}),
+        (owner, 'my_listings', {}),
+        (owner, 'list_your_car', {}),
+        (ADMIN_EMAIL, 'admin_panel', {}),
+    ]
+    for email, page, state in cases:
+        at = AppTest.from_file(APP_PATH, default_timeout=60)
+        if email:
+            at.session_state['logged_in'] = True
+            at.session_state['user_email'] = email
+        at.session_state['current_page'] = page
+        for key, value in state.items():
+            at.session_state[key] = value
+        at.run()
+        for exception in at.exception:
+            print(f"{page} raised: {exception.value}")
+
+def full_scans(conn, sql):
+    """Plan steps that walk a whole table or index instead of searching it"""
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+    scans = []
+    for row in plan:
+        detail = row[3]
+        if detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail and detail != 'SCAN CONSTANT ROW':
+            scans.append(detail)
+    return plan, scans
+
+def main():
+    verbose = '-v' in sys.argv
+    os.chdir(tempfile.mkdtemp(prefix='query_plans_'))
+    os.environ['IMAGE_BASE_URL'] = ''  # inline images; no sidecar to start
+    sqlite3.connect = tracing_connect
+
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    import app
+    import seed_data
+    seed_data.generate(app.DB_PATH, SEED_ROWS, image_pool=2)
+    conn = sqlite3.connect(app.DB_PATH)
+    c = conn.cursor()
+    renter = pick_user(c, 'SELECT user_email FROM insurance_claims LIMIT 1')
+    owner = pick_user(c, "SELECT owner_email FROM car_listings WHERE listing_status = 'approved' LIMIT 1")
+    conn.close()
+    statements.clear()
+
+    render_pages(renter, owner)
+    exercise_helpers(app, renter)
+
+    conn = sqlite3.connect(app.DB_PATH)
+    conn.set_trace_callback(None)
+    failures = 0
+    for normalized, sql in sorted(statements.items()):
+        plan, scans = full_scans(conn, sql)
+        allowed = next((reason for fragment, reason in ALLOWED_SCANS.items() if fragment in normalized), None)
+        if scans and not allowed:
+            failures += 1
+            print(f"FULL SCAN: {normalized}")
+        elif verbose:
+            print(f"ok{' (allowed: ' + allowed + ')' if scans else ''}: {normalized}")
+        if verbose or (scans and not allowed):
+            for row in plan:
+                print(f"    {row[3]}")
+
+    print(f"Checked {len(statements)} statements, {failures} full table scans")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
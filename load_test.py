@@ -0,0 +1,337 @@
+"""Drive many simultaneous Streamlit sessions against one database.
+
+Seeds a scratch database with seed_data.py (or uses --db), then starts
+--processes worker processes. Every worker owns a share of --sessions AppTest
+sessions, each logged in as a renter, an owner or the admin, and keeps them
+busy for --duration seconds with the actions those users take: browsing and
+searching, opening a car, booking it, approving bookings and moderating
+listings. AppTest is not thread-safe, so a worker runs one session at a time
+and concurrency comes from the number of processes. Every rerun is one
+sample, the same unit a browser click costs on a server. Reports throughput,
+latency percentiles per action, how often the app turned an action down as
+intended (a car already booked for those dates) and how often SQLite
+answered "database is locked".
+
+    python load_test.py [--sessions 200] [--processes 8] [--duration 60] [--json load_results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+ADMIN_EMAIL = 'admin@luxuryrentals.com'
+SEARCH_TERMS = ['porsche', 'ferrari turbo', 'range rover', 'electric', 'bentley', 'g 63']
+
+# role -> [(action, weight)]; weights are per action taken, not per rerun
+ACTION_MIX = {
+    'renter': [('browse', 35), ('search', 20), ('next_page', 10), ('car_details', 20), ('book', 10), ('my_bookings', 5)],
+    'owner': [('owner_bookings', 45), ('approve_booking', 35), ('my_listings', 20)],
+    'admin': [('admin_panel', 40), ('moderate_listing', 60)],
+}
+DEFAULT_ROLE_SHARE = {'renter': 0.8, 'owner': 0.15, 'admin': 0.05}
+# Messages the app shows when it correctly refuses an action, e.g. the double booking check
+EXPECTED_REJECTIONS = ('This car is already booked from', 'These dates overlap a confirmed booking')
+
+class SqliteCounters:
+    """Statements run and lock errors seen by every connection in this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statements = 0
+        self.lock_errors = 0
+
+    def track(self, call, *args):
+        with self.lock:
+            self.statements += 1
+        try:
+            return call(*args)
+        except sqlite3.OperationalError as e:
+            if 'locked' in str(e):
+                with self.lock:
+                    self.lock_errors += 1
+            raise
+
+counters = SqliteCounters()
+
+# Lock errors are often caught and printed by the app, so count them where they are raised
+class CountingCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        return counters.track(super().execute, *args)
+
+    def executemany(self, *args):
+        return counters.track(super().executemany, *args)
+
+class CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        return counters.track(super().commit)
+
+def counting_connect(*args, _connect=sqlite3.connect, **kwargs):
+    kwargs.setdefault('factory', CountingConnection)
+    return _connect(*args, **kwargs)
+
+def load_fixtures(db_path):
+    """Users per role and approved listings to act on"""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('SELECT DISTINCT user_email FROM bookings LIMIT 5000')
+    renters = [row[0] for row in c.fetchall()]
+    c.execute("SELECT DISTINCT owner_email FROM car_listings WHERE listing_status = 'approved' LIMIT 5000")
+    owners = [row[0] for row in c.fetchall()]
+    c.execute('''
+        SELECT id, model, year, price, location, specs, owner_email
+        FROM car_listings WHERE listing_status = 'approved' LIMIT 5000
+    ''')
+    listings = [
+        {
+            'id': row[0], 'model': row[1], 'year': row[2], 'price': row[3], 'location': row[4],
+            'specs': row[5], 'image': None, 'owner_email': row[6]
+        }
+        for row in c.fetchall()
+    ]
+    conn.close()
+    return {'renter': renters, 'owner': owners, 'admin': [ADMIN_EMAIL]}, listings
+
+class Session:
+    """One simulated user: an AppTest instance plus the role it acts as"""
+
+    def __init__(self, role, email, rng):
+        from streamlit.testing.v1 import AppTest
+        self.role = role
+        self.rng = rng
+        self.at = AppTest.from_file(APP_PATH, default_timeout=120)
+        self.at.session_state['logged_in'] = True
+        self.at.session_state['user_email'] = email
+        self.page = None
+
+    def goto(self, page, **state):
+        for key, value in state.items():
+            self.at.session_state[key] = value
+        self.at.session_state['current_page'] = page
+        self.page = page
+        return self.at.run
+
+    def on_page(self, page, **state):
+        """Run step that lands on page, or None when the session is already there"""
+        if self.page == page and not state:
+            return None
+        return self.goto(page, **state)
+
+    def search(self, term):
+        """Run step typing into the browse search box, or None when it is not shown"""
+        if not self.at.text_input:
+            return None
+        return self.at.text_input[0].input(term).run
+
+    def click(self, predicate):
+        """Run step clicking the first matching button, or None when there is none"""
+        buttons = [button for button in self.at.button if predicate(button)]
+        if not buttons:
+            return None
+        return self.rng.choice(buttons).click().run
+
+def action_steps(session, action, listings):
+    """Yield the reruns an action takes; each is a callable, or None to skip it"""
+    rng = session.rng
+    if action == 'browse':
+        yield session.goto('browse_cars')
+    elif action == 'search':
+        yield session.on_page('browse_cars')
+        yield session.search(rng.choice(SEARCH_TERMS))
+    elif action == 'next_page':
+        yield session.on_page('browse_cars')
+        yield session.click(lambda b: b.key == 'browse_next')
+    elif action == 'car_details':
+        yield session.goto('car_details', selected_car=rng.choice(listings))
+    elif action == 'book':
+        yield session.goto('book_car', selected_car=rng.choice(listings))
+        yield session.click(lambda b: b.label == 'Confirm Booking')
+    elif action in ('my_bookings', 'owner_bookings', 'my_listings', 'admin_panel'):
+        yield session.goto(action)
+    elif action == 'approve_booking':
+        yield session.on_page('owner_bookings')
+        yield session.click(lambda b: (b.key or '').startswith(('approve_', 'reject_')))
+    elif action == 'moderate_listing':
+        yield session.on_page('admin_panel')
+        yield session.click(lambda b: b.label in ('✅ Approve', '❌ Reject'))
+
+def run_worker(worker_id, sessions, duration, think_ms, seed):
+    """Process entry point: returns {action: [(ms, outcome), ...]} and SQLite counters"""
+    import streamlit.testing.v1.app_test as app_test
+    import streamlit.testing.v1.local_script_runner as local_script_runner
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    # Compile app.py once per process, as a server would (see render_harness.py)
+    shared_script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared_script_cache
+    sqlite3.connect = counting_connect
+
+    roles, listings = load_fixtures(os.environ['LOAD_TEST_DB'])
+    samples = {}
+    deadline = time.monotonic() + duration
+
+    rng = random.Random(seed * 1000 + worker_id)
+    live = [Session(role, rng.choice(roles[role]), random.Random(rng.random())) for role in sessions]
+    while time.monotonic() < deadline:
+        session = rng.choice(live)
+        actions, weights = zip(*ACTION_MIX[session.role])
+        action = rng.choices(actions, weights)[0]
+        for step in action_steps(session, action, listings):
+            if step is None:
+                continue
+            start = time.perf_counter()
+            try:
+                step()
+                exceptions = [str(e.value) for e in session.at.exception]
+                errors = [str(e.value) for e in session.at.error]
+            except Exception as e:
+                exceptions, errors = [f"{type(e).__name__}: {e}"], []
+            elapsed = (time.perf_counter() - start) * 1000
+            # Buttons such as Confirm Booking move the session to another page
+            session.page = session.at.session_state['current_page'] if 'current_page' in session.at.session_state else None
+            problems = exceptions + errors
+            if any('locked' in problem for problem in problems):
+                outcome = 'locked'
+            elif exceptions or any(not error.startswith(EXPECTED_REJECTIONS) for error in errors):
+                outcome = 'error'
+            elif errors:
+                outcome = 'rejected'
+            else:
+                outcome = 'ok'
+            samples.setdefault(action, []).append((elapsed, outcome))
+            if outcome != 'ok':
+                break
+        if think_ms:
+            time.sleep(rng.expovariate(1000 / think_ms))
+    return samples, counters.statements, counters.lock_errors
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(samples):
+    timings = [ms for ms, _ in samples]
+    return {
+        'reruns': len(samples),
+        'p50_ms': round(statistics.median(timings), 1),
+        'p95_ms': round(percentile(timings, 0.95), 1),
+        'p99_ms': round(percentile(timings, 0.99), 1),
+        'max_ms': round(max(timings), 1),
+        'errors': sum(outcome == 'error' for _, outcome in samples),
+        'rejected': sum(outcome == 'rejected' for _, outcome in samples),
+        'locked': sum(outcome == 'locked' for _, outcome in samples),
+    }
+
+def assign_roles(count, share, rng):
+    """Role of every session, in proportion to share"""
+    roles = []
+    for role, fraction in share.items():
+        roles += [role] * round(count * fraction)
+    roles = (roles + ['renter'] * count)[:count]
+    rng.shuffle(roles)
+    return roles
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=200, help='simulated users in total')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 4, help='worker processes')
+    parser.add_argument('--duration', type=float, default=60, help='seconds of load')
+    parser.add_argument('--think-ms', type=float, default=0, help='mean pause between actions per process')
+    parser.add_argument('--rows', type=int, default=10000, help='seed_data.py scale for the scratch database')
+    parser.add_argument('--db', help='existing database to load instead of seeding one; it is written to')
+    parser.add_argument('--owners', type=float, default=DEFAULT_ROLE_SHARE['owner'], help='share of owner sessions')
+    parser.add_argument('--admins', type=float, default=DEFAULT_ROLE_SHARE['admin'], help='share of admin sessions')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-cache', action='store_true', help='run with the read cache off')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    if args.db:
+        db_path = os.path.abspath(args.db)
+        os.chdir(os.path.dirname(db_path))  # the image store is relative to the working directory
+    else:
+        os.chdir(tempfile.mkdtemp(prefix='load_test_'))
+        db_path = os.path.abspath('car_rental.db')
+        sys.path.insert(0, os.path.dirname(APP_PATH))
+        import seed_data
+        print(f"Seeding {db_path} with --rows {args.rows}...")
+        seed_data.generate(db_path, args.rows, image_pool=4)
+
+    # Workers inherit these; app.py opens DB_PATH relative to the working directory
+    if os.path.basename(db_path) != 'car_rental.db':
+        parser.error('--db must point at a file named car_rental.db, the path app.py opens')
+    os.environ['LOAD_TEST_DB'] = db_path
+    # Measure pages as deployed with the image sidecar, not inline data: URIs
+    os.environ.setdefault('IMAGE_BASE_URL', 'http://localhost:8502')
+    if args.no_cache:
+        os.environ['READ_CACHE_MAX_BYTES'] = '0'
+
+    rng = random.Random(args.seed)
+    share = {'renter': 1 - args.owners - args.admins, 'owner': args.owners, 'admin': args.admins}
+    roles = assign_roles(args.sessions, share, rng)
+    processes = min(args.processes, args.sessions)
+    print(f"{args.sessions} sessions ({', '.join(f'{roles.count(r)} {r}' for r in share)}) on "
+          f"{processes} processes for {args.duration:.0f}s")
+
+    samples, statements, lock_errors = {}, 0, 0
+    start = time.perf_counter()
+    # Fresh interpreters, so no worker inherits the seeding run's state
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [
+            executor.submit(run_worker, i, roles[i::processes], args.duration, args.think_ms, args.seed)
+            for i in range(processes)
+        ]
+        for future in futures:
+            worker_samples, worker_statements, worker_lock_errors = future.result()
+            for action, action_samples in worker_samples.items():
+                samples.setdefault(action, []).extend(action_samples)
+            statements += worker_statements
+            lock_errors += worker_lock_errors
+    wall = time.perf_counter() - start
+
+    results = {action: summarize(action_samples) for action, action_samples in sorted(samples.items())}
+    everything = [sample for action_samples in samples.values() for sample in action_samples]
+    total = summarize(everything) if everything else None
+
+    print(f"{'action':18s} {'reruns':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} "
+          f"{'errors':>7s} {'rejected':>9s} {'locked':>7s}")
+    for action, result in list(results.items()) + ([('all', total)] if total else []):
+        print(f"{action:18s} {result['reruns']:7d} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} "
+              f"{result['p99_ms']:8.1f} {result['max_ms']:8.1f} {result['errors']:7d} {result['rejected']:9d} "
+              f"{result['locked']:7d}")
+
+    reruns = total['reruns'] if total else 0
+    print(f"Throughput: {reruns / wall:.1f} reruns/s over {wall:.1f}s")
+    print(f"SQLite: {statements} statements, {lock_errors} 'database is locked' errors "
+          f"({lock_errors / statements if statements else 0:.3%})")
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump({
+                'sessions': args.sessions, 'processes': processes,
+                'duration_s': round(wall, 1), 'cache': not args.no_cache,
+                'throughput_rps': round(reruns / wall, 1), 'statements': statements,
+                'lock_errors': lock_errors, 'total': total, 'actions': results,
+            }, f, indent=2)
+    return 1 if lock_errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""Booking prices from one rule set.
+
+Every price the app shows comes from here: the car's daily rate adjusted by
+the host's weekend and seasonal rules, add-on services, the renter's
+subscription discount, and the platform commission taken from the host.
+quote_many() prices any number of (listing, date range) requests with
+vectorized pandas/NumPy arithmetic; quote() is the single-booking case.
+
+demand_by_day() and suggest_prices() turn booking history into suggested
+daily rates for premium and elite hosts; app.refresh_price_suggestions()
+runs them over the days touched by new bookings.
+
+Dates are day numbers (days since 1970-01-01), as stored in the database.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Add-on services: name -> (price in AED, 'daily' or 'flat')
+SERVICES = {
+    'insurance': (50, 'daily'),
+    'driver': (100, 'daily'),
+    'delivery': (200, 'flat'),
+    'vip_service': (300, 'flat'),
+}
+SERVICE_LABELS = {
+    'insurance': 'Insurance',
+    'driver': 'Driver',
+    'delivery': 'Delivery',
+    'vip_service': 'VIP Service',
+}
+
+# Percent off the subtotal by renter plan
+SUBSCRIPTION_DISCOUNTS = {'premium_renter': 10, 'elite_renter': 20}
+
+# Share of the booking total kept by the platform, by host plan
+COMMISSION_RATES = {'free_host': 0.15, 'premium_host': 0.10, 'elite_host': 0.05}
+DEFAULT_COMMISSION_RATE = 0.15
+
+# Host rules adjust the daily rate by adjustment_pct: 'weekend' on WEEKEND_DAYS,
+# 'season' on the days from start_day to end_day; adjustments on one day add up,
+# down to MIN_ADJUSTMENT_PCT so a rate never drops to zero or below
+RULE_TYPES = ('weekend', 'season')
+MIN_ADJUSTMENT_PCT = -90
+RULE_COLUMNS = ['id', 'listing_id', 'rule_type', 'start_day', 'end_day', 'adjustment_pct']
+WEEKEND_DAYS = (5, 6)  # Saturday and Sunday, as date.weekday() numbers
+
+QUOTE_COLUMNS = ['days', 'base', *SERVICES, 'subtotal', 'discount_pct', 'discount', 'total']
+Quote = namedtuple('Quote', QUOTE_COLUMNS)
+
+# Demand signals per category and location, from trailing windows of booking history
+DEMAND_WINDOW = 28  # days behind each day's occupancy and lead time
+WEEKDAY_WEEKS = 8  # same-weekday samples behind the day-of-week factor
+DEMAND_LOOKBACK = max(DEMAND_WINDOW, 7 * WEEKDAY_WEEKS)  # a booking day moves the next DEMAND_LOOKBACK days
+DEMAND_COLUMNS = ['day', 'category', 'location', 'occupancy', 'lead_time', 'weekday_factor', 'multiplier']
+
+# Occupancy above the target and bookings made further ahead than usual raise the rate
+TARGET_OCCUPANCY = 0.6
+OCCUPANCY_SENSITIVITY = 0.5
+TYPICAL_LEAD_DAYS = 7
+LEAD_TIME_SENSITIVITY = 0.1
+WEEKDAY_FACTOR_RANGE = (0.8, 1.25)
+MULTIPLIER_RANGE = (0.8, 1.5)
+PRICE_STEP = 5  # suggestions are rounded to this many AED
+
+# Days of suggested prices shown by host plan
+SUGGESTION_HORIZONS = {'premium_host': 7, 'elite_host': 14}
+SUGGESTION_DAYS = max(SUGGESTION_HORIZONS.values())
+
+def describe_service(name):
+    """Checkbox label for an add-on, e.g. 'Insurance (AED 50/day)'"""
+    price, unit = SERVICES[name]
+    rate = f"AED {price}/day" if unit == 'daily' else f"Flat AED {price}"
+    return f"{SERVICE_LABELS[name]} ({rate})"
+
+def weekday(days):
+    """date.weekday() of day numbers; 1970-01-01 was a Thursday"""
+    return (np.asarray(days) + 3) % 7
+
+def _expand_days(first, lengths):
+    """(row position, day) for every day of consecutive ranges starting at first"""
+    positions = np.repeat(np.arange(len(lengths)), lengths)
+    days = first[positions] + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return positions, days
+
+def _rule_adjustments(listing_ids, day, rules):
+    # Summed adjustment_pct of the rules matching each (listing_id, day) pair, without the floor
+    adjustment = np.zeros(len(day))
+    if rules is None or not len(rules):
+        return adjustment
+    listing_ids = pd.Series(listing_ids)
+
+    weekend = rules[rules['rule_type'] == 'weekend'].groupby('listing_id')['adjustment_pct'].sum()
+    is_weekend = np.isin(weekday(day), WEEKEND_DAYS)
+    adjustment += listing_ids.map(weekend).fillna(0).to_numpy(dtype=float) * is_weekend
+
+    seasons = rules[rules['rule_type'] == 'season']
+    if len(seasons):
+        rental_days = pd.DataFrame({'pos': np.arange(len(day)), 'listing_id': listing_ids, 'day': day})
+        matched = rental_days.merge(seasons[['listing_id', 'start_day', 'end_day', 'adjustment_pct']], on='listing_id')
+        matched = matched[(matched['day'] >= matched['start_day']) & (matched['day'] <= matched['end_day'])]
+        adjustment += np.bincount(
+            matched['pos'].to_numpy(dtype=np.int64),
+            weights=matched['adjustment_pct'].to_numpy(dtype=float),
+            minlength=len(day)
+        )
+    return adjustment
+
+def lowest_adjustment(rules):
+    """Lowest summed adjustment_pct one listing's rules give any day, before the floor"""
+    if not len(rules):
+        return 0.0
+    # Sums only change at season boundaries and weekends, so every season day plus a week covers them all
+    seasons = rules[rules['rule_type'] == 'season']
+    first = int(seasons['start_day'].min()) if len(seasons) else 0
+    last = max(int(seasons['end_day'].max()) if len(seasons) else first, first) + 6
+    day = np.arange(first, last + 1)
+    listing_ids = np.full(len(day), rules['listing_id'].iloc[0])
+    return float(_rule_adjustments(listing_ids, day, rules).min())
+
+def quote_many(requests, rules=None, subscription_type=None):
+    """Price many bookings at once.
+
+    requests has listing_id, daily_rate, pickup_day and return_day columns,
+    plus an optional boolean column per add-on in SERVICES. rules has
+    RULE_COLUMNS. Both dates are rental days. Returns a DataFrame of
+    QUOTE_COLUMNS with the index of requests.
+    """
+    count = len(requests)
+    pickup = requests['pickup_day'].to_numpy(dtype=np.int64)
+    days = np.maximum(requests['return_day'].to_numpy(dtype=np.int64) - pickup + 1, 1)
+
+    # One element per rental day, pointing back at its request
+    request_pos, day = _expand_days(pickup, days)
+    adjustment = np.maximum(
+        _rule_adjustments(requests['listing_id'].to_numpy()[request_pos], day, rules), MIN_ADJUSTMENT_PCT
+    )
+
+    daily_rates = requests['daily_rate'].to_numpy(dtype=float)[request_pos] * (1 + adjustment / 100)
+    result = pd.DataFrame({
+        'days': days,
+        'base': np.bincount(request_pos, weights=daily_rates, minlength=count),
+    }, index=requests.index)
+
+    for name, (price, unit) in SERVICES.items():
+        chosen = requests[name].to_numpy(dtype=bool) if name in requests else np.zeros(count, dtype=bool)
+        result[name] = np.where(chosen, price * days if unit == 'daily' else price, 0).astype(float)
+
+    result['subtotal'] = result[['base', *SERVICES]].sum(axis=1)
+    result['discount_pct'] = SUBSCRIPTION_DISCOUNTS.get(subscription_type, 0)
+    result['discount'] = result['subtotal'] * result['discount_pct'] / 100
+    result['total'] = result['subtotal'] - result['discount']
+    return result
+
+def quote(daily_rate, pickup_day, return_day, services=(), rules=None, subscription_type=None, listing_id=0):
+    """Price one booking; services is a collection of SERVICES names"""
+    request = pd.DataFrame([{
+        'listing_id': listing_id,
+        'daily_rate': daily_rate,
+        'pickup_day': pickup_day,
+        'return_day': return_day,
+        **{name: name in services for name in SERVICES},
+    }])
+    row = quote_many(request, rules, subscription_type).iloc[0]
+    return Quote(int(row['days']), *(float(row[column]) for column in QUOTE_COLUMNS[1:]))
+
+def commission_rate(host_subscription):
+    return COMMISSION_RATES.get(host_subscription, DEFAULT_COMMISSION_RATE)
+
+def commission(total, host_subscription):
+    """(rate, platform fee, host earnings) for a booking total"""
+    rate = commission_rate(host_subscription)
+    fee = total * rate
+    return rate, fee, total - fee
+
+def demand_multiplier(occupancy, lead_time, weekday_factor):
+    """Factor on the daily rate for the given demand signals; lead_time may be NaN"""
+    lead_time = np.asarray(lead_time, dtype=float)
+    lead = np.clip((np.where(np.isnan(lead_time), TYPICAL_LEAD_DAYS, lead_time) - TYPICAL_LEAD_DAYS) / TYPICAL_LEAD_DAYS, -1, 1)
+    multiplier = (
+        (1 + OCCUPANCY_SENSITIVITY * (np.asarray(occupancy, dtype=float) - TARGET_OCCUPANCY))
+        * (1 + LEAD_TIME_SENSITIVITY * lead)
+        * np.clip(weekday_factor, *WEEKDAY_FACTOR_RANGE)
+    )
+    return np.clip(multiplier, *MULTIPLIER_RANGE)
+
+def demand_by_day(bookings, fleet, first_day, last_day):
+    """Demand signals for every fleet group on every day from first_day to last_day.
+
+    bookings has category, location, pickup_day, return_day and booked_day
+    (the day it was made, or NaN if unknown) and must hold every booking
+    overlapping the DEMAND_LOOKBACK days up to last_day; fleet has category,
+    location and cars. For each day, over the trailing windows ending on it:
+
+    - occupancy: share of the group's car-days booked over DEMAND_WINDOW days
+    - lead_time: mean days between booking and pickup over DEMAND_WINDOW days
+    - weekday_factor: occupancy on this weekday over WEEKDAY_WEEKS weeks
+      relative to all days in those weeks
+
+    Returns a DataFrame of DEMAND_COLUMNS.
+    """
+    start = first_day - DEMAND_LOOKBACK + 1
+    span = last_day - start + 1
+    groups = fleet[['category', 'location', 'cars']].reset_index(drop=True)
+    rows = bookings.merge(groups[['category', 'location']].rename_axis('group').reset_index(), on=['category', 'location'])
+    group = rows['group'].to_numpy(dtype=np.int64)
+    pickup = rows['pickup_day'].to_numpy(dtype=np.int64) - start
+    
+    # Booked cars per (day, group), from every rental day inside the span
+    first = np.maximum(pickup, 0)
+    last = np.minimum(rows['return_day'].to_numpy(dtype=np.int64) - start, span - 1)
+    inside = last >= first
+    booking_pos, day = _expand_days(first[inside], last[inside] - first[inside] + 1)
+    booked = np.zeros((span, len(groups)))
+    np.add.at(booked, (day, group[inside][booking_pos]), 1)
+    
+    # Lead time summed and counted on each booking's pickup day; booked_day may be missing
+    booked_day = rows['booked_day'].to_numpy(dtype=float)
+    picked = (pickup >= 0) & (pickup < span) & ~np.isnan(booked_day)
+    lead_days = np.maximum(rows['pickup_day'].to_numpy() - booked_day, 0)
+    lead_sum = np.zeros((span, len(groups)))
+    lead_count = np.zeros((span, len(groups)))
+    np.add.at(lead_sum, (pickup[picked], group[picked]), lead_days[picked])
+    np.add.at(lead_count, (pickup[picked], group[picked]), 1)
+    
+    # Rows are days, columns groups, so each rolling window runs down every group at once
+    daily = pd.DataFrame(booked / groups['cars'].to_numpy(dtype=float))
+    occupancy = daily.rolling(DEMAND_WINDOW).mean()
+    lead_time = pd.DataFrame(lead_sum).rolling(DEMAND_WINDOW).sum() / pd.DataFrame(lead_count).rolling(DEMAND_WINDOW).sum()
+    same_weekday = daily.groupby(weekday(np.arange(start, last_day + 1))).transform(
+        lambda frame: frame.rolling(WEEKDAY_WEEKS).mean()
+    )
+    weekday_factor = same_weekday / daily.rolling(7 * WEEKDAY_WEEKS).mean()
+    
+    # Keep first_day onwards, one row per (day, group)
+    kept = slice(first_day - start, None)
+    days = last_day - first_day + 1
+    result = pd.DataFrame({
+        'day': np.repeat(np.arange(first_day, last_day + 1), len(groups)),
+        'category': np.tile(groups['category'].to_numpy(), days),
+        'location': np.tile(groups['location'].to_numpy(), days),
+        'occupancy': occupancy.iloc[kept].to_numpy().ravel(),
+        'lead_time': lead_time.iloc[kept].to_numpy().ravel(),
+        'weekday_factor': np.nan_to_num(weekday_factor.iloc[kept].to_numpy().ravel(), nan=1.0),
+    })
+    result['multiplier'] = demand_multiplier(result['occupancy'], result['lead_time'], result['weekday_factor'])
+    return result
+
+def suggest_prices(listings, demand, first_day, days=SUGGESTION_DAYS):
+    """Suggested daily prices for each listing on the days from first_day.
+
+    listings has listing_id, category, location and daily_rate; demand has
+    DEMAND_COLUMNS rows for those days. A group with no demand row on a day
+    had no bookings in its windows and gets the multiplier for no demand.
+    """
+    calendar = pd.DataFrame({'day': np.arange(first_day, first_day + days)})
+    rows = listings.merge(calendar, how='cross').merge(
+        demand[['day', 'category', 'location', 'multiplier']], on=['day', 'category', 'location'], how='left'
+    )
+    rows['multiplier'] = rows['multiplier'].fillna(float(demand_multiplier(0.0, np.nan, 1.0)))
+    rows['suggested_price'] = (rows['daily_rate'] * rows['multiplier'] / PRICE_STEP).round() * PRICE_STEP
+    return rows[['listing_id', 'day', 'suggested_price', 'multiplier']]
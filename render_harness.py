@@ -0,0 +1,197 @@
+"""Render every page through Streamlit's AppTest and enforce per-page budgets.
+
+Seeds a scratch database with seed_data.py, then runs the app's main() for
+each page_handlers entry as the user role that page is meant for, recording
+wall time, SQL statements executed and the protobuf payload size of the
+rendered elements. Each page gets one session; after a warm-up run the
+samples are reruns, which is what every click in the app costs. Exits
+non-zero when a page raises, shows an error, or goes over its latency or
+query budget. The time AppTest itself adds is reported as the overhead of
+rerunning an empty script.
+
+    python render_harness.py [--rows 2000] [--repeat 5] [--no-cache] [--json render_results.json]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import streamlit.testing.v1.app_test as app_test
+import streamlit.testing.v1.local_script_runner as local_script_runner
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+ADMIN_EMAIL = 'admin@luxuryrentals.com'
+
+# (page, role, extra session state, p50 budget in ms, max SQL statements)
+PAGE_CASES = [
+    ('welcome', None, {}, 150, 0),
+    ('login', None, {}, 150, 0),
+    ('signup', None, {}, 150, 0),
+    ('about_us', None, {}, 150, 0),
+    ('browse_cars', None, {}, 400, 2),
+    ('browse_cars', 'renter', {}, 400, 3),
+    ('browse_cars', 'renter', {'browse_category': 'Sports', 'browse_sort': 'Price: Low to High'}, 400, 3),
+    ('browse_cars', 'renter', {
+        'browse_available_from': date.today() + timedelta(days=7),
+        'browse_available_to': date.today() + timedelta(days=10),
+    }, 400, 3),
+    ('car_details', 'renter', {'selected_car': 'listing'}, 300, 3),
+    ('book_car', 'renter', {'selected_car': 'listing'}, 300, 3),
+    ('my_bookings', 'renter', {}, 500, 4),
+    ('insurance_claims', 'renter', {}, 400, 4),
+    ('notifications', 'renter', {}, 300, 7),
+    ('subscription_plans', 'renter', {}, 300, 1),
+    ('owner_bookings', 'owner', {}, 800, 4),
+    ('my_listings', 'owner', {}, 600, 4),
+    ('my_listings', 'elite_host', {}, 600, 5),
+    ('list_your_car', 'owner', {}, 300, 2),
+    ('admin_panel', 'admin', {}, 2000, 8),
+]
+
+statements = []
+
+# AppTest builds a new ScriptCache per run and so recompiles app.py (with the
+# magic AST pass) every time; a server compiles it once, so share one here
+shared_script_cache = ScriptCache()
+app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared_script_cache
+
+def tracing_connect(*args, _connect=sqlite3.connect, **kwargs):
+    conn = _connect(*args, **kwargs)
+    conn.set_trace_callback(lambda sql: sql.startswith('--') or statements.append(sql))
+    return conn
+
+def payload_bytes(node):
+    """Serialized size of every element and block proto under node"""
+    proto = getattr(node, 'proto', None)
+    size = proto.ByteSize() if proto is not None else 0
+    for child in getattr(node, 'children', {}).values():
+        size += payload_bytes(child)
+    return size
+
+def resolve_roles(db_path):
+    """Pick seeded users that have data on the pages each role visits"""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('SELECT user_email FROM insurance_claims GROUP BY user_email ORDER BY COUNT(*) DESC LIMIT 1')
+    renter = c.fetchone()[0]
+    c.execute('''
+        SELECT cl.owner_email FROM bookings b JOIN car_listings cl ON b.car_id = cl.id
+        GROUP BY cl.owner_email ORDER BY COUNT(*) DESC LIMIT 1
+    ''')
+    owner = c.fetchone()[0]
+    # An elite host sees price suggestions on My Listings
+    c.execute('''
+        SELECT cl.owner_email FROM car_listings cl JOIN users u ON u.email = cl.owner_email
+        WHERE u.subscription_type = 'elite_host' AND cl.listing_status = 'approved'
+        GROUP BY cl.owner_email ORDER BY COUNT(*) DESC LIMIT 1
+    ''')
+    elite_host = c.fetchone()[0]
+    c.execute('''
+        SELECT id, model, year, price, location, specs, owner_email
+        FROM car_listings WHERE listing_status = 'approved' LIMIT 1
+    ''')
+    row = c.fetchone()
+    conn.close()
+    listing = {
+        'id': row[0], 'model': row[1], 'year': row[2], 'price': row[3], 'location': row[4],
+        'specs': row[5], 'image': None, 'owner_email': row[6]
+    }
+    return {'renter': renter, 'owner': owner, 'elite_host': elite_host, 'admin': ADMIN_EMAIL}, listing
+
+def open_session(email, page, state):
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    if email:
+        at.session_state['logged_in'] = True
+        at.session_state['user_email'] = email
+    at.session_state['current_page'] = page
+    for key, value in state.items():
+        at.session_state[key] = value
+    return at
+
+def rerun(at):
+    del statements[:]
+    start = time.perf_counter()
+    at.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    errors = [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+    return elapsed, len(statements), payload_bytes(at._tree), errors
+
+def harness_overhead(repeat):
+    """Median rerun time of an empty script, i.e. what AppTest adds to every sample"""
+    at = AppTest.from_string('', default_timeout=120)
+    at.run()
+    return statistics.median(rerun(at)[0] for _ in range(repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000, help='seed_data.py scale')
+    parser.add_argument('--repeat', type=int, default=5, help='samples per page')
+    parser.add_argument('--no-cache', action='store_true', help='render with the read cache off')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    os.chdir(tempfile.mkdtemp(prefix='render_harness_'))
+    # Measure pages as deployed with the image sidecar, not inline data: URIs
+    os.environ.setdefault('IMAGE_BASE_URL', 'http://localhost:8502')
+    if args.no_cache:
+        os.environ['READ_CACHE_MAX_BYTES'] = '0'
+    sqlite3.connect = tracing_connect
+
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    import app
+    import seed_data
+    seed_data.generate(app.DB_PATH, args.rows, image_pool=4)
+    roles, listing = resolve_roles(app.DB_PATH)
+
+    # The first run pays for the migrations check and image server start
+    open_session(None, 'welcome', {}).run()
+    overhead = harness_overhead(args.repeat)
+    print(f"AppTest overhead per rerun: {overhead:.1f} ms (included below)")
+
+    results, failures = [], 0
+    print(f"{'page':20s} {'role':10s} {'p50 ms':>8s} {'max ms':>8s} {'budget':>7s} {'queries':>8s} {'payload':>9s}")
+    for page, role, state, budget_ms, max_queries in PAGE_CASES:
+        state = {key: listing if value == 'listing' else value for key, value in state.items()}
+        at = open_session(roles.get(role), page, state)
+        warmup = rerun(at)
+        samples = [rerun(at) for _ in range(args.repeat)]
+        errors = sorted({error for sample in [warmup] + samples for error in sample[3]})
+        timings = [sample[0] for sample in samples]
+        queries = max(sample[1] for sample in samples)
+        result = {
+            'page': page, 'role': role or 'anonymous', 'state': sorted(state),
+            'p50_ms': round(statistics.median(timings), 1), 'max_ms': round(max(timings), 1),
+            'budget_ms': budget_ms, 'queries': queries, 'max_queries': max_queries,
+            'payload_bytes': samples[-1][2], 'errors': errors,
+        }
+        results.append(result)
+
+        problems = list(errors)
+        if result['p50_ms'] > budget_ms:
+            problems.append(f"p50 {result['p50_ms']} ms over budget {budget_ms} ms")
+        if queries > max_queries:
+            problems.append(f"{queries} queries, budget {max_queries}")
+        failures += bool(problems)
+        print(f"{page:20s} {result['role']:10s} {result['p50_ms']:8.1f} {result['max_ms']:8.1f} {budget_ms:7d} "
+              f"{queries:4d}/{max_queries:<3d} {result['payload_bytes']:9d}"
+              + (f"  FAIL: {'; '.join(problems)}" if problems else ''))
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump({
+                'rows': args.rows, 'cache': not args.no_cache,
+                'overhead_ms': round(overhead, 1), 'results': results
+            }, f, indent=2)
+    print(f"{len(results)} pages rendered, {failures} over budget or failing")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
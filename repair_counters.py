@@ -0,0 +1,45 @@
+"""Recompute the trigger-maintained user_counters table from scratch.
+
+The triggers keep the counters exact, so this is only needed after writes
+that bypassed them, such as a restore from an older backup or a manual edit
+with the triggers dropped. Runs in one write transaction.
+
+    python repair_counters.py [--db car_rental.db]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=app.DB_PATH, help='database file to repair')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    for pragma in app.SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    app.run_migrations(conn)
+
+    start = time.perf_counter()
+    c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        corrected = app.repair_user_counters(c)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"Recomputed user counters in {time.perf_counter() - start:.2f}s; {corrected} users were wrong")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""Generate a car_rental.db filled with synthetic data at a configurable scale.
+
+--rows sets the size of the largest tables (bookings and notifications); the
+other tables are derived from it in realistic proportions. Listing photos are
+a pool of camera-sized JPEGs stored through the app's image store, so the
+rows reference real files of realistic size.
+
+    python seed_data.py --rows 10000 [--db car_rental.db] [--image-pool 40] [--seed 1]
+"""
+import argparse
+import calendar
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app  # noqa: E402
+import pricing  # noqa: E402
+
+MAKES = {
+    'Luxury': ['Rolls-Royce Ghost', 'Bentley Flying Spur', 'Mercedes-Maybach S 680', 'BMW 7 Series'],
+    'SUV': ['Range Rover Autobiography', 'Mercedes G 63', 'Lamborghini Urus', 'Cadillac Escalade'],
+    'Sports': ['Ferrari 296 GTB', 'Porsche 911 Turbo S', 'McLaren 750S', 'Lamborghini Huracan'],
+    'Sedan': ['Audi A8', 'Mercedes S 580', 'Lexus LS 500', 'Genesis G90'],
+    'Convertible': ['Rolls-Royce Dawn', 'Ferrari Roma Spider', 'Porsche 911 Cabriolet', 'Bentley Continental GTC'],
+    'Electric': ['Porsche Taycan Turbo', 'Lucid Air Sapphire', 'Tesla Model S Plaid', 'Mercedes EQS'],
+}
+DESCRIPTIONS = [
+    'Immaculate condition, full service history and ceramic coating.',
+    'Perfect for a weekend on the coast road, delivered with a full tank.',
+    'Low mileage, panoramic roof, premium sound system.',
+    'Chauffeur available on request. Airport delivery included.',
+]
+BOOKING_STATUSES = ['pending', 'confirmed', 'completed', 'cancelled']
+LISTING_STATUSES = ['approved'] * 8 + ['pending', 'rejected']
+CLAIM_STATUSES = ['pending', 'approved', 'rejected', 'processing']
+NOTIFICATION_TYPES = ['booking_confirmed', 'listing_approved', 'claim_submitted', 'subscription_activated']
+PLANS = ['free_renter', 'premium_renter', 'elite_renter', 'free_host', 'premium_host', 'elite_host']
+
+def table_sizes(rows):
+    """Row counts per table for a given scale"""
+    return {
+        'users': max(50, rows // 10),
+        'car_listings': max(40, rows // 10),
+        'bookings': rows,
+        'insurance_claims': max(5, rows // 20),
+        'notifications': rows,
+        'subscription_history': max(10, rows // 40),
+        'broadcasts': max(3, rows // 1000),
+    }
+
+def photo_bytes(rng, width=1600, height=1067):
+    """A camera-sized, noisy image that compresses like a real photo"""
+    noise = Image.effect_noise((width // 4, height // 4), rng.randint(40, 90)).resize((width, height))
+    tint = Image.new('RGB', (width, height), (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    photo = Image.merge('RGB', [Image.blend(noise, band, 0.5) for band in tint.split()])
+    buffer = io.BytesIO()
+    photo.save(buffer, format='JPEG', quality=92)
+    buffer.seek(0)
+    return buffer
+
+def timestamp(rng, now, max_days_ago):
+    moment = now - timedelta(seconds=rng.randint(0, max_days_ago * 86400))
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def epoch_seconds(rng, now, max_days_ago):
+    # Same distribution as timestamp(), encoded the way bookings.created_at is stored
+    return calendar.timegm(datetime.strptime(timestamp(rng, now, max_days_ago), '%Y-%m-%d %H:%M:%S').timetuple())
+
+def generate(db_path, rows, image_pool=40, seed=1, batch_size=10000):
+    """Create and fill db_path; returns the row count per table"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    sizes = table_sizes(rows)
+    locations = app.get_location_options()
+    damage_types = app.get_damage_types()
+
+    conn = sqlite3.connect(db_path)
+    for pragma in app.SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    app.run_migrations(conn)
+    # Bulk load: durability does not matter until the final commit
+    conn.execute('PRAGMA synchronous = OFF')
+    c = conn.cursor()
+
+    images = [app.save_uploaded_image(photo_bytes(rng)) for _ in range(image_pool)]
+    password = app.hash_password('password')
+
+    def insert(sql, row_iter):
+        batch = []
+        for row in row_iter:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                c.executemany(sql, batch)
+                batch.clear()
+        if batch:
+            c.executemany(sql, batch)
+
+    user_count = sizes['users']
+    emails = [f"user{i}@example.com" for i in range(user_count)]
+    # A fifth of the users are hosts; they own every listing
+    hosts = emails[:max(1, user_count // 5)]
+    user_plans = {}
+    insert('''
+        INSERT INTO users (full_name, email, phone, password, role, profile_picture,
+        subscription_type, subscription_expiry, created_at)
+        VALUES (?, ?, ?, ?, 'user', ?, ?, ?, ?)
+    ''', (
+        (
+            f"User {i}", email, f"+9715{i:08d}"[:13], password,
+            rng.choice(images) if i % 3 == 0 else None,
+            user_plans.setdefault(email, rng.choice(PLANS[3:] if email in hosts else PLANS[:3])),
+            app.day_number((now + timedelta(days=rng.randint(-30, 330))).date()),
+            timestamp(rng, now, 730)
+        )
+        for i, email in enumerate(emails)
+    ))
+
+    listing_count = sizes['car_listings']
+    categories = list(MAKES)
+    listing_statuses = [rng.choice(LISTING_STATUSES) for _ in range(listing_count)]
+    listing_prices = {}
+
+    def listings():
+        for i in range(listing_count):
+            category = categories[i % len(categories)]
+            yield (
+                i + 1, rng.choice(hosts), rng.choice(MAKES[category]), rng.randint(2016, 2025),
+                listing_prices.setdefault(i + 1, float(rng.randrange(400, 6000, 50))),
+                rng.choice(locations), rng.choice(DESCRIPTIONS),
+                category,
+                json.dumps({
+                    'engine': rng.choice(['V8', 'V12', 'Electric', 'Twin-turbo V6']),
+                    'mileage': rng.randint(1000, 60000),
+                    'transmission': 'Automatic'
+                }),
+                listing_statuses[i], timestamp(rng, now, 730)
+            )
+    insert('''
+        INSERT INTO car_listings (id, owner_email, model, year, price, location, description,
+        category, specs, listing_status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', listings())
+
+    insert(
+        'INSERT INTO listing_images (listing_id, image_data, is_primary) VALUES (?, ?, ?)',
+        (
+            (listing_id, rng.choice(images), photo == 0)
+            for listing_id in range(1, listing_count + 1)
+            for photo in range(rng.randint(2, 5))
+        )
+    )
+    insert(
+        'INSERT INTO admin_reviews (listing_id, admin_email, comment, review_status, created_at) VALUES (?, ?, ?, ?, ?)',
+        (
+            (i + 1, 'admin@luxuryrentals.com', 'Checked documents and photos', status, timestamp(rng, now, 700))
+            for i, status in enumerate(listing_statuses) if status != 'pending'
+        )
+    )
+
+    approved_ids = [i + 1 for i, status in enumerate(listing_statuses) if status == 'approved']
+    renters = emails[len(hosts):] or emails
+    booking_owners = []
+
+    def bookings():
+        # Priced a batch at a time by the app's own rules: the car's rate, the
+        # chosen services and the renter's plan discount
+        for start in range(0, sizes['bookings'], batch_size):
+            batch = []
+            for _ in range(min(batch_size, sizes['bookings'] - start)):
+                renter = rng.choice(renters)
+                booking_owners.append(renter)
+                car_id = rng.choice(approved_ids)
+                pickup = app.day_number(now.date() + timedelta(days=rng.randint(-365, 120)))
+                batch.append({
+                    'user_email': renter, 'listing_id': car_id, 'daily_rate': listing_prices[car_id],
+                    'pickup_day': pickup, 'return_day': pickup + rng.randint(0, 13),
+                    'location': rng.choice(locations),
+                    'insurance': rng.random() < 0.6, 'driver': rng.random() < 0.2,
+                    'delivery': rng.random() < 0.3, 'vip_service': rng.random() < 0.05,
+                    'booking_status': rng.choice(BOOKING_STATUSES), 'created_at': epoch_seconds(rng, now, 365),
+                    'plan': user_plans[renter],
+                })
+            requests = pd.DataFrame(batch)
+            quotes = pd.concat([
+                pricing.quote_many(group, subscription_type=plan) for plan, group in requests.groupby('plan')
+            ]).loc[requests.index]
+            for row, quote in zip(batch, quotes.itertuples()):
+                yield (
+                    row['user_email'], row['listing_id'], row['pickup_day'], row['return_day'], row['location'],
+                    float(quote.total), row['insurance'], row['driver'], row['delivery'], row['vip_service'],
+                    row['booking_status'], row['created_at'],
+                    *(float(getattr(quote, name)) for name in pricing.SERVICES),
+                    float(quote.base), float(quote.discount)
+                )
+    insert('''
+        INSERT INTO bookings (user_email, car_id, pickup_date, return_date, location, total_price,
+        insurance, driver, delivery, vip_service, booking_status, created_at,
+        insurance_price, driver_price, delivery_price, vip_service_price, base_price, discount_amount)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', bookings())
+
+    claimed = rng.sample(range(1, sizes['bookings'] + 1), min(sizes['insurance_claims'], sizes['bookings']))
+    insert('''
+        INSERT INTO insurance_claims (booking_id, user_email, claim_date, incident_date, description,
+        damage_type, claim_amount, evidence_images, claim_status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        (
+            booking_id, booking_owners[booking_id - 1], now.date().isoformat(), app.day_number(now.date()),
+            'Found damage after the rental', rng.choice(damage_types), float(rng.randrange(200, 20000, 50)),
+            json.dumps(rng.sample(images, min(2, len(images)))), rng.choice(CLAIM_STATUSES),
+            timestamp(rng, now, 300)
+        )
+        for booking_id in claimed
+    ))
+
+    insert('''
+        INSERT INTO notifications (user_email, message, type, read, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        (
+            rng.choice(emails), 'Your booking status has changed.', rng.choice(NOTIFICATION_TYPES),
+            rng.random() < 0.7, timestamp(rng, now, 365)
+        )
+        for _ in range(sizes['notifications'])
+    ))
+
+    insert('''
+        INSERT INTO subscription_history (user_email, plan_type, start_date, end_date,
+        amount_paid, payment_method, status, created_at)
+        VALUES (?, ?, ?, ?, ?, 'Credit Card', 'active', ?)
+    ''', (
+        (
+            email, plan, app.day_number(now.date()), app.day_number(now.date() + timedelta(days=30)),
+            {'premium_renter': 20, 'elite_renter': 50, 'premium_host': 50, 'elite_host': 100}.get(plan, 0),
+            timestamp(rng, now, 365)
+        )
+        for email, plan in (
+            (rng.choice(emails), rng.choice(PLANS)) for _ in range(sizes['subscription_history'])
+        )
+    ))
+
+    insert('''
+        INSERT INTO broadcasts (message, created_by, created_at) VALUES (?, 'admin@luxuryrentals.com', ?)
+    ''', (
+        ('New cars have been added in your area.', created_at)
+        for created_at in sorted(timestamp(rng, now, 365) for _ in range(sizes['broadcasts']))
+    ))
+    # Most users have caught up with the broadcasts; the rest still count them as unread
+    insert('''
+        INSERT INTO broadcast_cursors (user_email, last_seen_id) VALUES (?, ?)
+    ''', ((email, sizes['broadcasts']) for email in emails if rng.random() < 0.8))
+
+    # Demand and price suggestions as the nightly update_price_suggestions.py run leaves them
+    app.refresh_price_suggestions(c)
+
+    conn.commit()
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.close()
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000, help='bookings and notifications to create')
+    parser.add_argument('--db', default=app.DB_PATH, help='database file to create')
+    parser.add_argument('--image-pool', type=int, default=40, help='distinct photos to generate')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists; remove it or pass --db")
+
+    start = time.perf_counter()
+    sizes = generate(args.db, args.rows, args.image_pool, args.seed)
+    print(f"Seeded {args.db} in {time.perf_counter() - start:.1f}s: "
+          + ', '.join(f"{table}={count}" for table, count in sizes.items()))
+
+if __name__ == '__main__':
+    main()
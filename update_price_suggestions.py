@@ -0,0 +1,49 @@
+"""Refresh the demand statistics and suggested daily prices shown to hosts.
+
+Booking writes record the days they touch, so each run only recomputes the
+demand around those days, plus the history of any category and location
+whose number of approved cars changed. Schedule it nightly, e.g. from cron;
+the first run on a database computes the whole history. Runs in one write
+transaction.
+
+    python update_price_suggestions.py [--db car_rental.db] [--full]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=app.DB_PATH, help='database file to update')
+    parser.add_argument('--full', action='store_true', help='recompute every day, not just the changed ones')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    for pragma in app.SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    app.run_migrations(conn)
+
+    start = time.perf_counter()
+    c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        days, suggestions = app.refresh_price_suggestions(c, full=args.full)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"Recomputed {days} days of demand and wrote {suggestions} price suggestions "
+          f"in {time.perf_counter() - start:.2f}s")
+
+if __name__ == '__main__':
+    main()